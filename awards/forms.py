@@ -4,7 +4,7 @@ from django.db import IntegrityError
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.forms.formsets import BaseFormSet
-from django.forms.models import ModelChoiceIterator
+from django.urls import reverse
 from django.utils.html import mark_safe
 from awards.models import Award, YearAward, Nomination, Vote, Phase, CURRENT_YEAR, check_eligible
 from forum.models import Member, MemberPage, Fic, FicPage
@@ -94,52 +94,26 @@ class FicForm(forms.ModelForm):
 
 class NominationObjectSelect(forms.Select):
     """
-    A customized Select that restricts the actual choices given to
-    those already nominated this year and the given value (if it
-    exists).
+    A customized Select that only renders the empty choice and the
+    given value (if it exists). Other fics/members nominated this year
+    are searched for on demand through the autocomplete URL given in
+    the data-autocomplete-url attribute.
 
     """
     def __init__(self, object_class, *args, **kwargs):
         self.object_class = object_class
         super(NominationObjectSelect, self).__init__(*args, **kwargs)
 
-    def optgroups(self, name, value, attrs=None):
-        groups = super(NominationObjectSelect, self).optgroups(name, value, attrs)
-
-        for val in value:
-            if val and val not in (choice[0] for choice in self.choices):
-                # The defined value is not in the available choices - check if it's a valid fic/member
-                selected_object = self.object_class.objects.filter(pk=val).first()
-                if selected_object:
-                    # We have a submitted value that's the PK for a fic/member - include that fic/member as a choice
-                    index = len(groups)
-                    groups.append((None, [
-                        self.create_option(
-                            name,
-                            selected_object.pk,
-                            str(selected_object),
-                            True,
-                            index,
-                            subindex=None,
-                            attrs=attrs
-                        )
-                    ], index))
-        return groups
-
-
-class NominationObjectIterator(ModelChoiceIterator):
-    """
-    A version of ModelChoiceIterator that limits the displayed choices
-    to those objects that have been nominated in the current year.
-
-    """
-    def __init__(self, field):
-        super(NominationObjectIterator, self).__init__(field)
-        self.queryset = self.queryset.nominated_in_year(CURRENT_YEAR)
-
+    def get_context(self, name, value, attrs):
+        attrs = dict(attrs or {}, **{'data-autocomplete-url': reverse('nomination_autocomplete_%s' % self.object_class._meta.model_name)})
+        return super(NominationObjectSelect, self).get_context(name, value, attrs)
 
-class NominationObjectChoiceField(forms.ModelChoiceField):
-    iterator = NominationObjectIterator
+    def optgroups(self, name, value, attrs=None):
+        selected = [val for val in value if val]
+        options = [self.create_option(name, '', '---------', not selected, 0, attrs=attrs)]
+        for index, selected_object in enumerate(self.object_class.objects.filter(pk__in=selected), 1):
+            options.append(self.create_option(name, selected_object.pk, str(selected_object), True, index, attrs=attrs))
+        return [(None, options, 0)]
 
 
 class NominationObjectField(ForumObjectField):
@@ -148,7 +122,9 @@ class NominationObjectField(ForumObjectField):
 
     """
     def get_object_field(self):
-        return NominationObjectChoiceField(queryset=self.object_class.objects.all(), widget=NominationObjectSelect(self.object_class))
+        # Only objects already nominated this year can be selected; others
+        # have to be entered by link.
+        return forms.ModelChoiceField(queryset=self.object_class.objects.nominated_in_year(CURRENT_YEAR), widget=NominationObjectSelect(self.object_class))
 
     def clean(self, value):
         value = super(NominationObjectField, self).clean(value)
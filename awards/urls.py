@@ -1,6 +1,7 @@
 from django.urls import re_path
 from django.views.generic.base import TemplateView, RedirectView
-from awards.views import NominationView, NominationLookupView, AllNominationsView, UserNominationsView, AdminNominationView, VotingView, VotingStatsView, ResultsView, PastAwardsView
+from forum.models import Fic, Member
+from awards.views import NominationView, NominationLookupView, NominationAutocompleteView, AllNominationsView, UserNominationsView, AdminNominationView, VotingView, VotingStatsView, ResultsView, PastAwardsView
 
 urlpatterns = [
     re_path(r'^nomination/$', NominationView.as_view(), name='nomination'),
@@ -10,6 +11,8 @@ urlpatterns = [
 
     re_path(r'^nomination/lookup/fic/$', NominationLookupView.as_view(model=Fic), name='nomination_lookup_fic'),
     re_path(r'^nomination/lookup/member/$', NominationLookupView.as_view(model=Member), name='nomination_lookup_member'),
+    re_path(r'^nomination/autocomplete/fic/$', NominationAutocompleteView.as_view(model=Fic, queryset=Fic.objects.prefetch_related('authors'), field='title'), name='nomination_autocomplete_fic'),
+    re_path(r'^nomination/autocomplete/member/$', NominationAutocompleteView.as_view(model=Member, field='username'), name='nomination_autocomplete_member'),
 
     re_path(r'^voting/$', VotingView.as_view(), name='voting'),
     re_path(r'^voting/stats/$', VotingStatsView.as_view(), name='voting_stats'),
@@ -12,10 +12,10 @@ from django.contrib import messages
 from django.contrib.auth import login
 from extra_views.formsets import FormSetView
 from awards.forms import YearAwardForm, BaseYearAwardFormSet, NominationForm, BaseNominationFormSet, VotingForm, AwardsVerificationForm
-from awards.models import YearAward, Nomination, Phase, PageView, check_eligible, verify_current
-from forum.models import Member, MemberPage, Fic
+from awards.models import YearAward, Nomination, Phase, PageView, CURRENT_YEAR, check_eligible, verify_current
+from forum.models import Member, MemberPage
 from forum.forms import TempUserProfileForm
-from forum.views import LoginRequiredMixin, ForumObjectLookupView, VerificationView
+from forum.views import CHECKED_MEMBER_SESSION_KEY, LoginRequiredMixin, AutocompleteView, ForumObjectLookupView, VerificationView
 from math import ceil
 
 
@@ -114,6 +114,8 @@ class TempUserMixin(object):
             if form.is_valid():
                 user = form.create_temp_user()
                 login(self.request, user)
+                # The form made sure the member has no other users.
+                self.request.session[CHECKED_MEMBER_SESSION_KEY] = user.member_id
                 messages.success(self.request, mark_safe(u'You have now been logged in as a temporary user. %s' % self.temp_user_success_message % reverse('verification')))
                 return HttpResponseRedirect(self.get_success_url())
             else:
@@ -155,12 +157,6 @@ class NominationView(TempUserMixin, FormSetView):
             self.request.session['unverified_nominations_%s' % settings.YEAR] = True
         return super(NominationView, self).formset_valid(formset)
 
-    def get_context_data(self, **kwargs):
-        context = super(NominationView, self).get_context_data(**kwargs)
-        context['all_fics'] = Fic.objects.prefetch_related('authors')
-        context['all_authors'] = Member.objects.all()
-        return context
-
 
 class AllNominationsView(PageViewMixin, ListView):
     page_name = 'all_nominations'
@@ -232,6 +228,16 @@ class NominationLookupView(ForumObjectLookupView):
         return page
 
 
+class NominationAutocompleteView(AutocompleteView):
+    """
+    Typeahead lookups of the fics/members nominated this year, for the
+    nomination form.
+
+    """
+    def get_queryset(self):
+        return super(NominationAutocompleteView, self).get_queryset().nominated_in_year(CURRENT_YEAR)
+
+
 class VotingView(TempUserMixin, FormView):
     form_class = VotingForm
     template_name = "voting.html"
@@ -1,8 +1,8 @@
 from django.urls import reverse_lazy, re_path
 from django.views.generic.base import TemplateView, RedirectView
 from django.contrib.auth.views import LoginView, LogoutView
-from forum.views import VerificationView, RegisterView, EditUserInfoView, ForumObjectLookupView, PasswordResetLookupView, PasswordResetView, CatalogView, CatalogAuthorView, CatalogFicView, CatalogSearchView, CatalogGenreView, CatalogTagView
-from reviewblitz.views import BlitzReviewSubmissionFormView, BlitzReviewApprovalQueueView, BlitzLeaderboardView, BlitzUserView, BlitzHistoryView, BlitzView, HasReviewedView
+from forum.views import VerificationView, RegisterView, EditUserInfoView, ForumObjectLookupView, AutocompleteView, PasswordResetLookupView, PasswordResetView, CatalogView, CatalogAuthorView, CatalogFicView, CatalogSearchView, CatalogGenreView, CatalogTagView, CatalogTagListView, CatalogExportView
+from reviewblitz.views import BlitzReviewSubmissionFormView, BlitzReviewApprovalQueueView, BlitzLeaderboardView, BlitzLeaderboardJSONView, BlitzUserView, BlitzHistoryView, BlitzView, HasReviewedView
 from forum.models import Member, Fic, Chapter
 
 from django.contrib import admin
@@ -17,6 +17,8 @@ urlpatterns = [
     re_path(r'^catalog/search/$', CatalogSearchView.as_view(), name='catalog_search'),
     re_path(r'^catalog/genre/(?P<slug>[\w-]+)/$', CatalogGenreView.as_view(), name='catalog_genre'),
     re_path(r'^catalog/tag/(?P<tag>[\w-]+)/$', CatalogTagView.as_view(), name='catalog_tag'),
+    re_path(r'^catalog/tags/$', CatalogTagListView.as_view(), name='catalog_tags'),
+    re_path(r'^catalog/export/$', CatalogExportView.as_view(), name='catalog_export'),
     re_path(r'^login/$', LoginView.as_view(template_name='login.html'), name='login'),
     re_path(r'^reset_password/$', PasswordResetLookupView.as_view(), name='reset_password'),
     re_path(r'^reset_password/user/(?P<pk>\d+)/$', PasswordResetView.as_view(), name='reset_password'),
@@ -28,12 +30,15 @@ urlpatterns = [
     re_path(r'^lookup/fic/$', ForumObjectLookupView.as_view(model=Fic), name='lookup_fic'),
     re_path(r'^lookup/member/$', ForumObjectLookupView.as_view(model=Member), name='lookup_member'),
     re_path(r'^lookup/chapter/$', ForumObjectLookupView.as_view(model=Chapter), name='lookup_chapter'),
+    re_path(r'^autocomplete/fic/$', AutocompleteView.as_view(model=Fic, queryset=Fic.objects.prefetch_related('authors'), field='title'), name='autocomplete_fic'),
+    re_path(r'^autocomplete/member/$', AutocompleteView.as_view(model=Member, field='username'), name='autocomplete_member'),
 
     re_path(r'^blitz/history/$', BlitzHistoryView.as_view(), name="blitz_history"),
     re_path(r'^blitz/submit/$', BlitzReviewSubmissionFormView.as_view(), name="blitz_review_submit"),
     re_path(r'^blitz/queue/$', BlitzReviewApprovalQueueView.as_view(), name="blitz_review_approval_queue"),
     re_path(r'^blitz/approval_guide/$', TemplateView.as_view(template_name="blitz_review_approval_guidelines.html"), name="blitz_review_approval_guidelines"),
     re_path(r'^blitz/leaderboard/$', BlitzLeaderboardView.as_view(), name="blitz_leaderboard"),
+    re_path(r'^blitz/leaderboard\.json$', BlitzLeaderboardJSONView.as_view(), name="blitz_leaderboard_json"),
     re_path(r'^blitz/has_reviewed/$', HasReviewedView.as_view(), name="has_reviewed"),
     re_path(r'^blitz/user/$', BlitzUserView.as_view(), name="blitz_user"),
     re_path(r'^blitz/(?P<pk>\d+)/$', BlitzView.as_view(), name="blitz"),
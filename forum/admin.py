@@ -2,7 +2,7 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.dispatch import Signal
-from forum.models import User, Member, Fic, Genre, Review
+from forum.models import User, Member, Fic, Genre, Tag, Review, end_unverified_sessions
 
 member_manually_verified = Signal()
 member_user_id_updated = Signal()
@@ -23,6 +23,8 @@ class ForumUserAdmin(UserAdmin):
         if change and obj.verified and 'verified' in form.changed_data:
             member_manually_verified.send(sender=self.__class__, instance=obj.member)
         super(ForumUserAdmin, self).save_model(request, obj, form, change)
+        if obj.verified and obj.member_id is not None and {'verified', 'member'} & set(form.changed_data):
+            end_unverified_sessions(obj.member_id)
 
 
 class MemberAdmin(admin.ModelAdmin):
@@ -40,6 +42,12 @@ class MemberAdmin(admin.ModelAdmin):
             old_instance.delete()
 
 
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'fic_count']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ('name',)}
+
+
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['author', 'fic', 'posted_date', 'word_count', 'chapters', 'edit']
     list_display_links = ['edit']
@@ -56,4 +64,5 @@ admin.site.register(User, ForumUserAdmin)
 admin.site.register(Member, MemberAdmin)
 admin.site.register(Fic)
 admin.site.register(Genre)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Review, ReviewAdmin)
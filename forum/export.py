@@ -0,0 +1,96 @@
+"""
+Exports of the whole fic catalog as JSON lines or CSV, for use in
+spreadsheets and wiki pages.
+
+Fics are read from the database in chunks, with their authors, genres,
+tags and chapters prefetched a chunk at a time, and each fic is written
+out as soon as it has been read, so memory use stays flat however big
+the catalog gets.
+
+"""
+import csv
+import json
+from django.db.models import Count
+from forum.models import Fic
+
+CHUNK_SIZE = 500
+
+CSV_HEADER = [
+    'id', 'title', 'link', 'authors', 'author_ids', 'posted_date', 'completed',
+    'genres', 'tags', 'chapters', 'word_count', 'reviews', 'summary',
+]
+
+
+def get_export_queryset():
+    return Fic.objects.prefetch_related('authors', 'genres', 'tags', 'chapters').annotate(review_count=Count('reviews')).order_by('pk')
+
+
+def iter_fics(queryset=None, chunk_size=CHUNK_SIZE):
+    if queryset is None:
+        queryset = get_export_queryset()
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def fic_to_dict(fic):
+    return {
+        'id': fic.pk,
+        'title': fic.title,
+        'link': fic.link(),
+        'authors': [{'user_id': author.user_id, 'username': author.username} for author in fic.authors.all()],
+        'posted_date': fic.posted_date.isoformat(),
+        'completed': fic.completed,
+        'summary': fic.summary,
+        'genres': [genre.name for genre in fic.genres.all()],
+        'tags': [tag.name for tag in fic.tags.all()],
+        'chapters': [
+            {'post_id': chapter.post_id, 'title': chapter.threadmark_title, 'posted_date': chapter.posted_date.isoformat(), 'word_count': chapter.word_count}
+            for chapter in fic.chapters.all()
+        ],
+        'reviews': fic.review_count,
+    }
+
+
+def fic_to_row(fic):
+    authors = list(fic.authors.all())
+    chapters = list(fic.chapters.all())
+    return [
+        fic.pk,
+        fic.title,
+        fic.link(),
+        '; '.join(author.username for author in authors),
+        '; '.join(str(author.user_id) for author in authors),
+        fic.posted_date.isoformat(),
+        fic.completed,
+        '; '.join(genre.name for genre in fic.genres.all()),
+        '; '.join(tag.name for tag in fic.tags.all()),
+        len(chapters),
+        sum(chapter.word_count for chapter in chapters),
+        fic.review_count,
+        fic.summary,
+    ]
+
+
+def export_jsonl(queryset=None, chunk_size=CHUNK_SIZE):
+    for fic in iter_fics(queryset, chunk_size):
+        yield json.dumps(fic_to_dict(fic)) + '\n'
+
+
+class Echo(object):
+    """A file-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset=None, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for fic in iter_fics(queryset, chunk_size):
+        yield writer.writerow(fic_to_row(fic))
+
+
+# Export format: (generator, content type)
+EXPORT_FORMATS = {
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+}
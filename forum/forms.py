@@ -5,7 +5,6 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate
 from django.contrib.auth.forms import UserCreationForm
-from django.db.models import Q
 from django.urls import reverse
 from django.utils.crypto import get_random_string
 from django.utils.html import format_html, mark_safe
@@ -160,9 +159,8 @@ class CatalogSearchForm(forms.Form):
 
     def get_results(self):
         if self.is_valid():
-            query = self.cleaned_data['query']
-            return Fic.objects.filter(Q(tags__tag__icontains=query) | Q(title__icontains=query) | Q(summary__icontains=query))
-        return []
+            return Fic.objects.search(self.cleaned_data['query'])
+        return Fic.objects.none()
 
 
 class CatalogFicForm(forms.ModelForm):
@@ -175,10 +173,14 @@ class CatalogFicForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if self.instance.pk:
-            self.fields['tags'].initial = ', '.join([tag.tag for tag in self.instance.tags.all()])
+            self.fields['tags'].initial = ', '.join([tag.name for tag in self.instance.tags.all()])
 
     def clean_tags(self):
-        return [slugify(tag) for tag in self.cleaned_data['tags'].split(',') if slugify(tag)]
+        tags = [tag.strip() for tag in self.cleaned_data['tags'].split(',') if tag.strip()]
+        invalid = [tag for tag in tags if not slugify(tag)]
+        if invalid:
+            raise ValidationError("Tags must contain at least one Latin letter or number: %s" % ', '.join(invalid))
+        return [slugify(tag) for tag in tags]
 
     def save(self, commit=True):
         self.instance._tags = self.cleaned_data['tags']
@@ -0,0 +1,70 @@
+import random
+import time
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from forum.models import Fic, FicTag, Tag
+from forum.search import get_search_backend
+
+WORDS = (
+    "pokemon trainer journey legendary gym badge rival league champion storm forest ocean "
+    "mountain cave ruins shadow light dream memory ghost dragon fire water grass electric "
+    "psychic friendship loss war peace family home lost found secret promise winter summer"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Times catalog searches against a synthetic catalog. Nothing is saved: the catalog is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fics', type=int, default=50000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = get_search_backend()
+        self.stdout.write("Search backend: %s" % backend.__class__.__name__)
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.create_catalog(rng, options['fics'])
+            backend.rebuild()
+            self.stdout.write("Created and indexed %d fics in %.1f s." % (options['fics'], time.perf_counter() - start))
+
+            queries = [' '.join(rng.sample(WORDS, rng.randint(1, 3))) for i in range(options['queries'])]
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                results = Fic.objects.search(query)
+                results.count()
+                list(results[:50])
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            self.stdout.write("%d queries (count + first page of 50): mean %.1f ms, median %.1f ms, p95 %.1f ms, max %.1f ms" % (
+                len(timings),
+                sum(timings) / len(timings),
+                timings[len(timings) // 2],
+                timings[int(len(timings) * 0.95)],
+                timings[-1]
+            ))
+            transaction.set_rollback(True)
+
+    def create_catalog(self, rng, count):
+        first_id = (Fic.objects.order_by('-thread_id').values_list('thread_id', flat=True).first() or 0) + 1
+        posted_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        Fic.objects.bulk_create((
+            Fic(
+                title=' '.join(rng.sample(WORDS, rng.randint(1, 4))).title(),
+                thread_id=first_id + i,
+                posted_date=posted_date,
+                summary=' '.join(rng.choice(WORDS) for j in range(rng.randint(10, 60)))
+            ) for i in range(count)
+        ), batch_size=2000)
+        fic_ids = Fic.objects.filter(thread_id__gte=first_id).values_list('id', flat=True)
+        tags = {tag.name: tag for tag in Tag.objects.get_or_create_all(WORDS)}
+        FicTag.objects.bulk_create((
+            FicTag(fic_id=fic_id, tag=tags[word]) for fic_id in fic_ids for word in rng.sample(WORDS, rng.randint(0, 3))
+        ), batch_size=2000)
+        Tag.objects.filter(pk__in=[tag.pk for tag in tags.values()]).update_fic_counts()
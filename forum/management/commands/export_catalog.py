@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from forum.export import CHUNK_SIZE, EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = "Exports the whole fic catalog as JSON lines or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='jsonl', help="The export format (default: jsonl).")
+        parser.add_argument('--output', help="The file to write the export to (default: standard output).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="How many fics to read from the database at a time.")
+
+    def handle(self, *args, **options):
+        export, content_type = EXPORT_FORMATS[options['format']]
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                for chunk in export(chunk_size=options['chunk_size']):
+                    f.write(chunk)
+        else:
+            for chunk in export(chunk_size=options['chunk_size']):
+                self.stdout.write(chunk, ending='')
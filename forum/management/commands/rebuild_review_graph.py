@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from forum.models import ReviewedAuthor
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the record of which members have reviewed which authors from the stored reviews."
+
+    def handle(self, *args, **options):
+        count = ReviewedAuthor.objects.rebuild()
+        self.stdout.write("Rebuilt %d reviewer/author pair(s)." % count)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from forum.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the catalog full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write("Rebuilt the search index using %s." % backend.__class__.__name__)
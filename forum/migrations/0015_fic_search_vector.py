@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:18
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE INDEX forum_fic_search_vector_gin ON forum_fic USING gin (search_vector)")
+        schema_editor.execute("""
+            UPDATE forum_fic SET search_vector =
+                setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE((SELECT string_agg(tag, ' ') FROM forum_fictag WHERE fic_id = forum_fic.id), '')), 'B') ||
+                setweight(to_tsvector('english', COALESCE(summary, '')), 'C')
+        """)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if 'ENABLE_FTS5' not in (row[0] for row in cursor.fetchall()):
+                # No FTS5 - search will fall back to substring matching.
+                return
+        schema_editor.execute("CREATE VIRTUAL TABLE forum_fic_fts USING fts5(title, tags, summary, tokenize='porter unicode61', prefix='2 3')")
+        schema_editor.execute("""
+            INSERT INTO forum_fic_fts (rowid, title, tags, summary)
+            SELECT id, title, COALESCE((SELECT group_concat(tag, ' ') FROM forum_fictag WHERE fic_id = forum_fic.id), ''), summary
+            FROM forum_fic
+        """)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS forum_fic_search_vector_gin")
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS forum_fic_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0014_alter_fic_id_alter_fic_related_fics_alter_fictag_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fic',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:22
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX forum_fic_title_trgm ON forum_fic USING gin (UPPER(title) gin_trgm_ops)")
+    schema_editor.execute("CREATE INDEX forum_member_username_trgm ON forum_member USING gin (UPPER(username) gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS forum_fic_title_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS forum_member_username_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0015_fic_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fic',
+            index=models.Index(django.db.models.functions.text.Upper('title'), name='forum_fic_title_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(django.db.models.functions.text.Upper('username'), name='forum_member_username_upper'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
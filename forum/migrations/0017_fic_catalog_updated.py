@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0016_name_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fic',
+            name='catalog_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='fic',
+            index=models.Index(fields=['title', 'id'], name='forum_fic_title_id'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+
+def create_tags(apps, schema_editor):
+    """
+    Turns each distinct tag string into a Tag, pointing the existing
+    FicTag rows at it and dropping any that end up duplicated.
+
+    """
+    Tag = apps.get_model('forum', 'Tag')
+    FicTag = apps.get_model('forum', 'FicTag')
+    tags = {}
+    seen = set()
+    for fic_tag in FicTag.objects.order_by('pk').iterator():
+        slug = slugify(fic_tag.tag)[:50] or 'tag-%s' % fic_tag.pk
+        if slug not in tags:
+            tags[slug] = Tag.objects.create(name=fic_tag.tag, slug=slug)
+        if (fic_tag.fic_id, slug) in seen:
+            fic_tag.delete()
+            continue
+        seen.add((fic_tag.fic_id, slug))
+        fic_tag.tag_ref = tags[slug]
+        fic_tag.save(update_fields=['tag_ref'])
+    Tag.objects.update(fic_count=Coalesce(Subquery(
+        FicTag.objects.filter(tag_ref=OuterRef('pk')).values('tag_ref').annotate(count=Count('*')).values('count')
+    ), 0))
+
+
+def restore_tag_strings(apps, schema_editor):
+    FicTag = apps.get_model('forum', 'FicTag')
+    for fic_tag in FicTag.objects.select_related('tag_ref').iterator():
+        fic_tag.tag = fic_tag.tag_ref.name
+        fic_tag.save(update_fields=['tag'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0017_fic_catalog_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(unique=True)),
+                ('fic_count', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+            options={
+                'ordering': ['slug'],
+                'indexes': [models.Index(fields=['-fic_count', 'slug'], name='forum_tag_fic_count')],
+            },
+        ),
+        migrations.AddField(
+            model_name='fictag',
+            name='tag_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='forum.tag'),
+        ),
+        migrations.AlterField(
+            model_name='fictag',
+            name='tag',
+            field=models.CharField(db_index=True, max_length=50, null=True),
+        ),
+        migrations.RunPython(create_tags, restore_tag_strings),
+        migrations.RemoveField(
+            model_name='fictag',
+            name='tag',
+        ),
+        migrations.RenameField(
+            model_name='fictag',
+            old_name='tag_ref',
+            new_name='tag',
+        ),
+        migrations.AlterField(
+            model_name='fictag',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fic_tags', to='forum.tag'),
+        ),
+        migrations.AlterField(
+            model_name='fictag',
+            name='fic',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fic_tags', to='forum.fic'),
+        ),
+        migrations.AddConstraint(
+            model_name='fictag',
+            constraint=models.UniqueConstraint(fields=('tag', 'fic'), name='forum_fictag_unique'),
+        ),
+        migrations.AddField(
+            model_name='fic',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='fics', through='forum.FicTag', to='forum.tag'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0018_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='body',
+            field=models.BinaryField(null=True),
+        ),
+    ]
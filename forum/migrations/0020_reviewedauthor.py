@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def fill_reviewed_authors(apps, schema_editor):
+    # A copy of ReviewedAuthorQuerySet.rebuild as of this migration.
+    Review = apps.get_model('forum', 'Review')
+    ReviewedAuthor = apps.get_model('forum', 'ReviewedAuthor')
+    stats = Review.objects.filter(fic__authors__isnull=False).values('author', 'fic__authors').annotate(
+        review_count=Count('pk'), chapter_count=Sum('chapters'), last_reviewed=Max('posted_date')
+    ).order_by()
+    ReviewedAuthor.objects.bulk_create([
+        ReviewedAuthor(reviewer_id=edge['author'], author_id=edge['fic__authors'], reviews=edge['review_count'], chapters=edge['chapter_count'], last_reviewed=edge['last_reviewed'])
+        for edge in stats if edge['author'] != edge['fic__authors']
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0019_review_body'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewedAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('chapters', models.PositiveIntegerField(default=0)),
+                ('last_reviewed', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviewed_by', to='forum.member')),
+                ('reviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviewed_authors', to='forum.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', 'reviewer'], name='forum_reviewedauthor_author')],
+                'constraints': [models.UniqueConstraint(fields=('reviewer', 'author'), name='forum_reviewedauthor_unique')],
+            },
+        ),
+        migrations.RunPython(fill_reviewed_authors, migrations.RunPython.noop),
+    ]
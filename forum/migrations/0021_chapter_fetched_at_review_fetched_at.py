@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0020_reviewedauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='fetched_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='fetched_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
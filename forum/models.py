@@ -3,17 +3,31 @@ import re
 import requests
 import string
 import secrets
-from datetime import datetime, timezone
-from django.db import models
-from django.db.models import Q
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from django.db import models, transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Upper
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.contrib.auth import logout
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
+from django.utils.text import slugify
 from forum.api import get_user_info
+from forum.search import forget_search_backends, get_search_backend
 from bs4 import BeautifulSoup
 
 
+# The pages fetched on each thread while a page registry is open.
+_page_registry = threading.local()
+
+
 def get_tz_string(offset):
     return '{:0=+3d}00'.format(offset)
 
@@ -25,8 +39,60 @@ def pretty_join(items, word='and'):
 
 
 def get_soup(url):
+    soups = getattr(_page_registry, 'soups', None)
+    if soups is not None and url in soups:
+        return soups[url]
     request = requests.get(url)
-    return BeautifulSoup(request.text, 'html.parser')
+    soup = BeautifulSoup(request.text, 'html.parser')
+    if soups is not None:
+        soups[url] = soup
+    return soup
+
+
+def get_soups(urls, max_workers=8):
+    """
+    Fetches the given pages concurrently, using at most max_workers
+    connections at once, and returns their soups in the same order.
+
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(get_soup, urls))
+
+
+@contextmanager
+def page_registry():
+    """
+    Remembers every page fetched with get_soup on this thread until the
+    block exits, so that each page is only fetched once, e.g. while a
+    form is being cleaned. Pages can be fetched into it in advance with
+    prefetch_soups.
+
+    """
+    if getattr(_page_registry, 'soups', None) is not None:
+        # Already inside one
+        yield _page_registry.soups
+        return
+    _page_registry.soups = {}
+    try:
+        yield _page_registry.soups
+    finally:
+        _page_registry.soups = None
+
+
+def prefetch_soups(urls, max_workers=8):
+    """
+    Fetches the given pages concurrently into the current page registry,
+    skipping any that are already in it. Outside a page registry this
+    does nothing, as the pages would not be remembered.
+
+    """
+    soups = getattr(_page_registry, 'soups', None)
+    if soups is None:
+        return
+    missing = [url for url in dict.fromkeys(urls) if url not in soups]
+    soups.update(zip(missing, get_soups(missing, max_workers)))
 
 
 class ForumPage(object):
@@ -55,7 +121,7 @@ class ForumPage(object):
         If force_download is True, the page will always be fetched and
         parsed; otherwise, it'll just grab the relevant parameters from
         the URL and find an existing object matching those parameters,
-        if one exists.
+        if one exists and was fetched recently enough (see fresh_for).
 
         """
         params = cls.get_params_from_url(url)  # Will raise ValueError if the URL is invalid
@@ -89,7 +155,8 @@ class ForumPage(object):
                 # See if we can get the object from the database just from the
                 # parameters
                 obj = cls.object_class.objects.get(**lookup_kwargs)
-                return cls(obj)
+                if obj.is_fresh():
+                    return cls(obj)
             except (cls.object_class.DoesNotExist, cls.object_class.MultipleObjectsReturned):
                 pass
         # Either this doesn't exist in the database, we can't uniquely
@@ -146,6 +213,12 @@ class ForumObject(object):
 
     """
     _page = None
+    # How long a copy fetched from the forums (as of its fetched_at) is
+    # used before it's fetched again; None if a stored copy always is.
+    fresh_for = None
+
+    def is_fresh(self):
+        return self.fresh_for is None or self.fetched_at is not None and datetime.now(timezone.utc) - self.fetched_at < self.fresh_for
 
     @classmethod
     def get_page_class(self):
@@ -186,6 +259,7 @@ class Member(ForumObject, models.Model):
 
     class Meta:
         ordering = ['username']
+        indexes = [models.Index(Upper('username'), name='forum_member_username_upper')]
 
     def __str__(self):
         return self.username
@@ -218,7 +292,11 @@ class Member(ForumObject, models.Model):
             else:
                 self.user_id = Member.objects.get_next_guest_id()
         self.user_id = int(self.user_id)
-        return super(Member, self).save(*args, **kwargs)
+        renamed = Member.objects.filter(user_id=self.user_id).exclude(username=self.username).exists()
+        result = super(Member, self).save(*args, **kwargs)
+        if renamed:
+            Fic.objects.filter(authors=self).touch()
+        return result
 
 
 class MemberPage(ForumPage):
@@ -315,6 +393,42 @@ class User(AbstractUser):
         return member
 
 
+class CacheVersion(models.Model):
+    """
+    A version number for something kept in memory by each process (see
+    forum.utils.get_cache_version). It's kept in the database rather
+    than the cache, which isn't shared between processes.
+
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "{} v{}".format(self.key, self.version)
+
+
+def member_has_verified_user(member_id):
+    """
+    Returns whether there is a verified user for the given member.
+
+    """
+    return User.objects.filter(member_id=member_id, verified=True).exists()
+
+
+def end_unverified_sessions(member_id):
+    """
+    Logs the given member's unverified (temporary) users out wherever
+    they're logged in, once the member has a verified user. Their
+    passwords are made unusable, which Django takes as a reason to end
+    their sessions on their next request; temporary users never knew
+    their random passwords anyway.
+
+    """
+    for user in User.objects.filter(member_id=member_id, verified=False):
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+
+
 class Genre(models.Model):
     """A fic genre."""
     name = models.CharField(max_length=50)
@@ -323,11 +437,75 @@ class Genre(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(Genre, self).save(*args, **kwargs)
+        Fic.objects.filter(genres=self).touch()
+
+
+class TagQuerySet(models.QuerySet):
+    def get_or_create_all(self, names):
+        """
+        Returns the tags with the given names, creating any that don't
+        exist yet. Names are matched on their slugs; a name without one
+        (e.g. only punctuation) raises ValueError.
+
+        """
+        names = {slugify(name): name for name in names}
+        if '' in names:
+            raise ValueError("Tag name %r has no slug." % names[''])
+        existing = set(self.filter(slug__in=names).values_list('slug', flat=True))
+        self.bulk_create([Tag(name=name, slug=slug) for slug, name in names.items() if slug not in existing], ignore_conflicts=True)
+        return list(self.filter(slug__in=names))
+
+    def update_fic_counts(self):
+        return self.update(fic_count=Coalesce(Subquery(
+            FicTag.objects.filter(tag=OuterRef('pk')).values('tag').annotate(count=Count('*')).values('count')
+        ), 0))
+
+
+class Tag(models.Model):
+    """A tag for fics."""
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(unique=True)
+    # How many fics have this tag; kept up to date as fics are tagged.
+    fic_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TagQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['slug']
+        indexes = [models.Index(fields=['-fic_count', 'slug'], name='forum_tag_fic_count')]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        super(Tag, self).save(*args, **kwargs)
+        Fic.objects.filter(tags=self).touch()
+        # The tag may have been renamed
+        get_search_backend(self._state.db).index_fics(self.fic_tags.values_list('fic_id', flat=True))
+
 
 class FicQuerySet(models.QuerySet):
     def nominated_in_year(self, year):
         return self.filter(nominations__year=year).distinct()
 
+    def touch(self):
+        """
+        Marks the fics as changed, so that their cached catalog entries
+        are no longer used.
+
+        """
+        return self.update(catalog_updated=datetime.now(timezone.utc))
+
+    def search(self, query):
+        """
+        Returns the fics matching the given search query, best matches
+        first. The result can be sliced and paginated like a queryset.
+
+        """
+        return get_search_backend(self.db).search(self, query)
+
 
 class FicManager(models.Manager):
     def get_queryset(self):
@@ -336,6 +514,12 @@ class FicManager(models.Manager):
     def nominated_in_year(self, year):
         return self.get_queryset().nominated_in_year(year)
 
+    def search(self, query):
+        return self.get_queryset().search(query)
+
+    def touch(self):
+        return self.get_queryset().touch()
+
 
 class Fic(ForumObject, models.Model):
     """
@@ -349,8 +533,14 @@ class Fic(ForumObject, models.Model):
     posted_date = models.DateTimeField()
     summary = models.TextField(blank=True)
     genres = models.ManyToManyField(Genre, blank=True, related_name='fics')
+    tags = models.ManyToManyField(Tag, through='FicTag', blank=True, related_name='fics')
     completed = models.BooleanField(default=False)
     related_fics = models.ManyToManyField('self', blank=True)
+    # Only used on PostgreSQL; see forum.search.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Changes whenever anything shown in the fic's catalog entry does;
+    # used as the version of its cached entry.
+    catalog_updated = models.DateTimeField(auto_now=True)
 
     objects = FicManager()
 
@@ -360,6 +550,10 @@ class Fic(ForumObject, models.Model):
     class Meta:
         unique_together = ['thread_id', 'post_id']
         ordering = ['title', 'thread_id', 'post_id']
+        indexes = [
+            models.Index(Upper('title'), name='forum_fic_title_upper'),
+            models.Index(fields=['title', 'id'], name='forum_fic_title_id'),
+        ]
 
     def __str__(self):
         return u"%s by %s" % (self.title, self.get_author_names())
@@ -413,10 +607,8 @@ class Fic(ForumObject, models.Model):
             existing_authors = self.authors.all()
             self.authors.add(*[author for author in self._authors if author not in existing_authors])
         if self._tags:
-            FicTag.objects.filter(~Q(tag__in=self._tags), fic=self).delete()
-            for tag in self._tags:
-                if not FicTag.objects.filter(fic=self, tag=tag).exists():
-                    FicTag.objects.create(fic=self, tag=tag)
+            self.tags.set(Tag.objects.get_or_create_all(self._tags))
+        get_search_backend(self._state.db).index_fic(self)
 
 
 class ThreadIterator:
@@ -661,13 +853,81 @@ class FicPage(ThreadPage):
 
 
 class FicTag(models.Model):
-    """A tag for a fic."""
+    """A tag on a fic."""
 
-    tag = models.CharField(max_length=50, db_index=True)
-    fic = models.ForeignKey(Fic, related_name='tags', on_delete=models.CASCADE)
+    fic = models.ForeignKey(Fic, related_name='fic_tags', on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, related_name='fic_tags', on_delete=models.CASCADE)
 
-    def __unicode__(self):
-        return self.tag
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tag', 'fic'], name='forum_fictag_unique')]
+
+    def __str__(self):
+        return str(self.tag)
+
+
+@receiver(post_save, sender=FicTag)
+@receiver(post_delete, sender=FicTag)
+def update_tagged_fic(sender, instance, **kwargs):
+    Fic.objects.filter(pk=instance.fic_id).touch()
+    Tag.objects.filter(pk=instance.tag_id).update_fic_counts()
+    get_search_backend(instance._state.db).index_fics([instance.fic_id])
+
+
+@receiver(m2m_changed, sender=Fic.tags.through)
+def update_tag_fic_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Tag.objects.filter(pk=instance.pk).update_fic_counts()
+    elif action in ('post_add', 'post_remove'):
+        Tag.objects.filter(pk__in=pk_set).update_fic_counts()
+    elif action == 'pre_clear':
+        instance._cleared_tag_ids = list(instance.fic_tags.values_list('tag_id', flat=True))
+    elif action == 'post_clear':
+        Tag.objects.filter(pk__in=instance._cleared_tag_ids).update_fic_counts()
+
+
+@receiver(m2m_changed, sender=Fic.tags.through)
+def reindex_fics_with_changed_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    backend = get_search_backend(instance._state.db)
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            backend.index_fics([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        backend.index_fics(pk_set)
+    elif action == 'pre_clear':
+        instance._cleared_fic_ids = list(instance.fic_tags.values_list('fic_id', flat=True))
+    elif action == 'post_clear':
+        backend.index_fics(instance._cleared_fic_ids)
+
+
+@receiver(post_delete, sender=Fic)
+def unindex_deleted_fic(sender, instance, **kwargs):
+    get_search_backend(instance._state.db).index_fics([instance.pk])
+
+
+@receiver(post_migrate)
+def choose_search_backends_again(sender, **kwargs):
+    # The FTS table may have been migrated in or out
+    forget_search_backends()
+
+
+@receiver(m2m_changed, sender=Fic.tags.through)
+@receiver(m2m_changed, sender=Fic.authors.through)
+@receiver(m2m_changed, sender=Fic.genres.through)
+def touch_fics_with_changed_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Fic.objects.filter(pk=instance.pk).touch()
+    elif action in ('post_add', 'post_remove'):
+        Fic.objects.filter(pk__in=pk_set).touch()
+    elif action == 'pre_clear':
+        # The fics won't be related to the instance after the clear
+        instance.fics.touch()
+
+
+@receiver(pre_delete, sender=Genre)
+def touch_fics_in_deleted_genre(sender, instance, **kwargs):
+    instance.fics.touch()
 
 
 class Post(object):
@@ -741,6 +1001,31 @@ class PostPage(ThreadPage):
     def from_params(cls, save=False, force_download=False, url=None, object_type=None, **kwargs):
         return super().from_params(save, force_download, url, 'post', **kwargs)
 
+    @classmethod
+    def prefetch(cls, urls, max_workers=8):
+        """
+        Fetches the given post pages concurrently into the current page
+        registry, followed by the threads they're in for any fics we
+        don't know yet, so that loading the posts fetches nothing more.
+        Like prefetch_soups, this does nothing outside a page registry.
+
+        """
+        soups = getattr(_page_registry, 'soups', None)
+        if soups is None:
+            return
+        prefetch_soups(urls, max_workers)
+        thread_ids = set()
+        for url in urls:
+            attribution = soups[url].find(class_="message-attribution-main")
+            if attribution and attribution.a:
+                try:
+                    thread_ids.add(int(ThreadPage.get_params_from_url(attribution.a['href'])['thread_id']))
+                except (KeyError, TypeError, ValueError):
+                    # Loading the post will complain about this
+                    pass
+        thread_ids -= set(Fic.objects.filter(thread_id__in=thread_ids).values_list('thread_id', flat=True))
+        prefetch_soups([Fic(thread_id=thread_id).link() for thread_id in thread_ids], max_workers)
+
     def load_object(self, save=True, object_type=None, allow_offsite=False):
         soup = self.get_soup()
 
@@ -750,6 +1035,10 @@ class PostPage(ThreadPage):
         self.object.word_count = post.word_count
         if hasattr(self.object, 'threadmark_title'):
             self.object.threadmark_title = post.threadmark_title
+        if hasattr(self.object, 'body_text'):
+            self.object.body_text = post.body_text
+        if hasattr(self.object, 'fetched_at'):
+            self.object.fetched_at = datetime.now(timezone.utc)
 
         thread_link = soup.find(class_="message-attribution-main").a
         if not thread_link:
@@ -769,6 +1058,12 @@ class Review(ForumObject, models.Model):
     posted_date = models.DateTimeField()
     word_count = models.PositiveIntegerField()
     chapters = models.PositiveIntegerField(default=1)
+    # The text of the post, minus quotes, as zlib-compressed UTF-8.
+    body = models.BinaryField(null=True, editable=False)
+    fetched_at = models.DateTimeField(null=True, editable=False)
+
+    # Reviews may be edited, e.g. to reach the minimum word count
+    fresh_for = timedelta(hours=1)
 
     class Meta:
         ordering = ("author", "post_id")
@@ -776,6 +1071,14 @@ class Review(ForumObject, models.Model):
     def __str__(self):
         return "{}'s review on {}".format(self.author, self.fic.title)
 
+    @property
+    def body_text(self):
+        return zlib.decompress(self.body).decode('utf-8') if self.body is not None else None
+
+    @body_text.setter
+    def body_text(self, text):
+        self.body = zlib.compress(text.encode('utf-8'))
+
     def link(self):
         return f"https://{settings.FORUM_URL}posts/{self.post_id}/"
 
@@ -810,7 +1113,82 @@ class ReviewPage(PostPage):
         return self.object
 
 
-class Chapter(models.Model):
+class ReviewedAuthorQuerySet(models.QuerySet):
+    def rebuild(self, reviewers=None, authors=None):
+        """
+        Recalculates how often each of the given reviewers has reviewed
+        each of the given authors (or everyone, if either is None) from
+        the reviews stored here.
+
+        """
+        filters = {'fic__authors__isnull': False}
+        edges = self.all()
+        if reviewers is not None:
+            filters['author__in'] = reviewers
+            edges = edges.filter(reviewer__in=reviewers)
+        if authors is not None:
+            filters['fic__authors__in'] = authors
+            edges = edges.filter(author__in=authors)
+        stats = Review.objects.filter(**filters).values('author', 'fic__authors').annotate(
+            review_count=Count('pk'),
+            chapter_count=Sum('chapters'),
+            last_reviewed=Max('posted_date')
+        ).order_by()
+        with transaction.atomic():
+            edges.delete()
+            return len(self.bulk_create([
+                ReviewedAuthor(reviewer_id=edge['author'], author_id=edge['fic__authors'], reviews=edge['review_count'], chapters=edge['chapter_count'], last_reviewed=edge['last_reviewed'])
+                for edge in stats if edge['author'] != edge['fic__authors']
+            ]))
+
+
+class ReviewedAuthor(models.Model):
+    """
+    How often a member has reviewed another member's fics, going by the
+    reviews stored here.
+
+    """
+    reviewer = models.ForeignKey(Member, related_name='reviewed_authors', on_delete=models.CASCADE)
+    author = models.ForeignKey(Member, related_name='reviewed_by', on_delete=models.CASCADE)
+    reviews = models.PositiveIntegerField(default=0)
+    chapters = models.PositiveIntegerField(default=0)
+    last_reviewed = models.DateTimeField()
+
+    objects = ReviewedAuthorQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['reviewer', 'author'], name='forum_reviewedauthor_unique')]
+        indexes = [models.Index(fields=['author', 'reviewer'], name='forum_reviewedauthor_author')]
+
+    def __str__(self):
+        return "{} has reviewed {} {} time{}".format(self.reviewer, self.author, self.reviews, '' if self.reviews == 1 else 's')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_reviewed_authors(sender, instance, **kwargs):
+    ReviewedAuthor.objects.rebuild(reviewers=[instance.author_id], authors=list(instance.fic.authors.values_list('pk', flat=True)))
+
+
+@receiver(m2m_changed, sender=Fic.authors.through)
+def update_reviewed_authors_of_fic(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # A member was added to or removed from some fics
+        if action in ('post_add', 'post_remove'):
+            ReviewedAuthor.objects.rebuild(reviewers=Review.objects.filter(fic__in=pk_set).values('author'), authors=[instance.pk])
+        elif action == 'pre_clear':
+            instance._cleared_fic_ids = list(instance.fics.values_list('pk', flat=True))
+        elif action == 'post_clear':
+            ReviewedAuthor.objects.rebuild(reviewers=Review.objects.filter(fic__in=instance._cleared_fic_ids).values('author'), authors=[instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        ReviewedAuthor.objects.rebuild(reviewers=instance.reviews.values('author'), authors=pk_set)
+    elif action == 'pre_clear':
+        instance._cleared_author_ids = list(instance.authors.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        ReviewedAuthor.objects.rebuild(reviewers=instance.reviews.values('author'), authors=instance._cleared_author_ids)
+
+
+class Chapter(ForumObject, models.Model):
     """A chapter of a fic."""
 
     post_id = models.PositiveIntegerField(unique=True, primary_key=True)
@@ -818,6 +1196,9 @@ class Chapter(models.Model):
     threadmark_title = models.CharField(max_length=255)
     posted_date = models.DateTimeField()
     word_count = models.PositiveIntegerField()
+    fetched_at = models.DateTimeField(null=True, editable=False)
+
+    fresh_for = timedelta(days=7)
 
     class Meta:
         ordering = ('fic', 'posted_date')
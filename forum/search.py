@@ -0,0 +1,257 @@
+"""
+Full-text search over the fic catalog, and typeahead lookups of fics
+and members by name.
+
+On PostgreSQL, each fic carries a weighted tsvector (title > tags >
+summary) in Fic.search_vector, backed by a GIN index. On SQLite, an FTS5
+virtual table mirrors the same three columns, keyed by the fic's ID.
+Anything else falls back to plain substring matching.
+
+The index is updated whenever a fic is saved (see Fic.save), and for
+the fics affected whenever a fic is deleted or tags are added, removed
+or renamed (see the receivers in forum.models); the
+rebuild_search_index management command rebuilds it from scratch.
+
+Typeahead lookups match on the start of the name using an index on
+UPPER(name) everywhere, and on PostgreSQL match anywhere in the name
+using a trigram index on the same expression.
+
+"""
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, TextField, Value, When
+from django.db.models.functions import Upper
+
+FTS_TABLE = 'forum_fic_fts'
+
+# Relative importance of matches in the title, tags and summary.
+SQLITE_BM25_WEIGHTS = (20.0, 5.0, 1.0)
+POSTGRES_CONFIG = 'english'
+
+
+class RankedSearchResults(object):
+    """
+    Search results that are only fetched one slice at a time, so they
+    can be handed straight to a Paginator.
+
+    """
+    def __init__(self, backend, queryset, query):
+        self.backend = backend
+        self.queryset = queryset
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count_matches(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            offset = k.start or 0
+            limit = (k.stop if k.stop is not None else self.count()) - offset
+            if limit <= 0:
+                return []
+            ids = self.backend.ranked_ids(self.query, offset, limit)
+            objects = self.queryset.in_bulk(ids)
+            return [objects[pk] for pk in ids if pk in objects]
+        results = self[k:k + 1]
+        if not results:
+            raise IndexError("Search result index out of range.")
+        return results[0]
+
+
+class SubstringSearchBackend(object):
+    """
+    The fallback: an unranked substring match over titles, tags and
+    summaries.
+
+    """
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def connection(self):
+        # Connections are per-thread, so they can't be kept on the backend.
+        return connections[self.alias]
+
+    def search(self, queryset, query):
+        return queryset.filter(Q(tags__name__icontains=query) | Q(title__icontains=query) | Q(summary__icontains=query)).distinct().order_by('title', 'pk')
+
+    def upper(self, term):
+        # Has to match the database's UPPER(), and SQLite's only changes
+        # ASCII letters: "poké" must become "POKé" there, not "POKÉ". So on
+        # SQLite, prefixes only match regardless of case in their ASCII
+        # letters; "poké" doesn't find "POKÉMON".
+        if self.connection.vendor == 'sqlite':
+            return ''.join(char.upper() if char.isascii() else char for char in term)
+        return term.upper()
+
+    def autocomplete(self, queryset, field, term):
+        # A range over UPPER(field) rather than a LIKE, so that a plain
+        # B-tree index on the expression can be used.
+        prefix = self.upper(term)
+        return queryset.annotate(
+            name_upper=Upper(field)
+        ).filter(
+            name_upper__gte=prefix,
+            name_upper__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        ).order_by('name_upper', 'pk')
+
+    def index_fic(self, fic):
+        pass
+
+    def index_fics(self, fic_ids):
+        """
+        Reindexes the fics with the given IDs from the database, dropping
+        any that no longer exist from the index.
+
+        """
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class PostgresSearchBackend(SubstringSearchBackend):
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, search_type='websearch', config=POSTGRES_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).filter(search_vector=search_query).order_by('-rank', 'title', 'pk')
+
+    def autocomplete(self, queryset, field, term):
+        # Django's icontains compiles to UPPER(field) LIKE UPPER(...), which
+        # the trigram index covers. Names starting with the term come first.
+        return queryset.filter(**{field + '__icontains': term}).annotate(
+            prefix_match=Case(When(**{field + '__istartswith': term, 'then': 0}), default=1, output_field=IntegerField())
+        ).order_by('prefix_match', Upper(field), 'pk')
+
+    def index_fic(self, fic):
+        tags = ' '.join(fic.tags.values_list('name', flat=True))
+        fic.__class__.objects.filter(pk=fic.pk).update(search_vector=(
+            SearchVector(Value(fic.title, output_field=TextField()), weight='A', config=POSTGRES_CONFIG)
+            + SearchVector(Value(tags, output_field=TextField()), weight='B', config=POSTGRES_CONFIG)
+            + SearchVector(Value(fic.summary, output_field=TextField()), weight='C', config=POSTGRES_CONFIG)
+        ))
+
+    def update_vectors(self, where='', params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE forum_fic SET search_vector =
+                    setweight(to_tsvector(%(config)s, COALESCE(title, '')), 'A') ||
+                    setweight(to_tsvector(%(config)s, COALESCE((SELECT string_agg(forum_tag.name, ' ') FROM forum_fictag INNER JOIN forum_tag ON forum_tag.id = forum_fictag.tag_id WHERE forum_fictag.fic_id = forum_fic.id), '')), 'B') ||
+                    setweight(to_tsvector(%(config)s, COALESCE(summary, '')), 'C')
+            """ + where, dict(params or {}, config=POSTGRES_CONFIG))
+
+    def index_fics(self, fic_ids):
+        # Deleted fics take their vectors with them.
+        fic_ids = list(fic_ids)
+        if fic_ids:
+            self.update_vectors("WHERE forum_fic.id = ANY(%(ids)s)", {'ids': fic_ids})
+
+    def rebuild(self):
+        self.update_vectors()
+
+
+class SQLiteSearchBackend(SubstringSearchBackend):
+    def match_expression(self, query):
+        # Quote every word so that FTS5 query syntax in the user's input
+        # is never interpreted, and allow prefix matches on each of them.
+        return ' '.join('"%s"*' % word for word in re.findall(r'\w+', query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return RankedSearchResults(self, queryset, match)
+
+    def count_matches(self, match):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM {0} WHERE {0} MATCH %s".format(FTS_TABLE), [match])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, match, offset, limit):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, %s, %s, %s), rowid LIMIT %s OFFSET %s".format(FTS_TABLE),
+                [match, *SQLITE_BM25_WEIGHTS, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_fic(self, fic):
+        tags = ' '.join(fic.tags.values_list('name', flat=True))
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {} WHERE rowid = %s".format(FTS_TABLE), [fic.pk])
+            cursor.execute(
+                "INSERT INTO {} (rowid, title, tags, summary) VALUES (%s, %s, %s, %s)".format(FTS_TABLE),
+                [fic.pk, fic.title, tags, fic.summary]
+            )
+
+    def copy_fics(self, cursor, where='', params=()):
+        cursor.execute("""
+            INSERT INTO {} (rowid, title, tags, summary)
+            SELECT id, title, COALESCE((SELECT group_concat(forum_tag.name, ' ') FROM forum_fictag INNER JOIN forum_tag ON forum_tag.id = forum_fictag.tag_id WHERE forum_fictag.fic_id = forum_fic.id), ''), summary
+            FROM forum_fic
+        """.format(FTS_TABLE) + where, params)
+
+    def index_fics(self, fic_ids):
+        fic_ids = list(fic_ids)
+        if not fic_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(fic_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {} WHERE rowid IN ({})".format(FTS_TABLE, placeholders), fic_ids)
+            self.copy_fics(cursor, "WHERE id IN ({})".format(placeholders), fic_ids)
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {}".format(FTS_TABLE))
+            self.copy_fics(cursor)
+
+
+def sqlite_has_fts_table(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+# The full-text search backend of each database, once it has one.
+_search_backends = {}
+
+
+def get_search_backend(using='default'):
+    """
+    Returns the search backend for the given database. Falling back to
+    substring matching isn't remembered, so that a SQLite database gets
+    full-text search as soon as the FTS table is migrated in; see
+    forget_search_backends.
+
+    """
+    backend = _search_backends.get(using)
+    if backend is None:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            backend = PostgresSearchBackend(using)
+        elif connection.vendor == 'sqlite' and sqlite_has_fts_table(connection):
+            backend = SQLiteSearchBackend(using)
+        else:
+            return SubstringSearchBackend(using)
+        _search_backends[using] = backend
+    return backend
+
+
+def forget_search_backends():
+    """
+    Makes get_search_backend choose each database's backend afresh, e.g.
+    after migrating, which may have added or removed the FTS table.
+
+    """
+    _search_backends.clear()
@@ -1,3 +1,161 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from forum.forms import CatalogFicForm
+from forum.models import Fic, FicTag, Member, ReviewPage, Tag, User, choose_search_backends_again, end_unverified_sessions, get_soup, member_has_verified_user, page_registry, prefetch_soups
+from forum import search
+from forum.search import SQLiteSearchBackend, SubstringSearchBackend, forget_search_backends, get_search_backend
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.fic = Fic.objects.create(title="The Long Road", thread_id=1, posted_date=datetime(2024, 1, 1, tzinfo=timezone.utc), summary="A journey.")
+        self.other_fic = Fic.objects.create(title="Another Road", thread_id=2, posted_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        self.tag = Tag.objects.create(name="Dragons", slug="dragons")
+
+    def search(self, query):
+        results = Fic.objects.search(query)
+        return len(results), [fic.pk for fic in results]
+
+    def test_deleted_fic(self):
+        count, pks = self.search("road")
+        self.assertEqual((count, set(pks)), (2, {self.fic.pk, self.other_fic.pk}))
+        self.fic.delete()
+        self.assertEqual(self.search("road"), (1, [self.other_fic.pk]))
+
+    def test_fic_tag_saved_and_deleted(self):
+        fic_tag = FicTag.objects.create(fic=self.fic, tag=self.tag)
+        self.assertEqual(self.search("dragons"), (1, [self.fic.pk]))
+        fic_tag.delete()
+        self.assertEqual(self.search("dragons"), (0, []))
+
+    def test_tags_added_and_cleared(self):
+        self.tag.fics.add(self.fic, self.other_fic)
+        self.assertEqual(self.search("dragons")[0], 2)
+        self.tag.fics.clear()
+        self.assertEqual(self.search("dragons"), (0, []))
+        self.fic.tags.add(self.tag)
+        self.assertEqual(self.search("dragons"), (1, [self.fic.pk]))
+        self.fic.tags.remove(self.tag)
+        self.assertEqual(self.search("dragons"), (0, []))
+
+    def test_tag_renamed(self):
+        FicTag.objects.create(fic=self.fic, tag=self.tag)
+        self.tag.name = "Wyverns"
+        self.tag.save()
+        self.assertEqual(self.search("dragons"), (0, []))
+        self.assertEqual(self.search("wyverns"), (1, [self.fic.pk]))
+
+    def test_tag_deleted(self):
+        FicTag.objects.create(fic=self.fic, tag=self.tag)
+        self.tag.delete()
+        self.assertEqual(self.search("dragons"), (0, []))
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        for thread_id, title in enumerate(["Pokémon Journeys", "Poker Night", "ÉCLAIR"], start=1):
+            Fic.objects.create(title=title, thread_id=thread_id, posted_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    def autocomplete(self, term):
+        return [fic.title for fic in get_search_backend().autocomplete(Fic.objects.all(), 'title', term)]
+
+    def test_ascii_prefix(self):
+        self.assertEqual(set(self.autocomplete("pok")), {"Pokémon Journeys", "Poker Night"})
+
+    def test_non_ascii_prefix(self):
+        self.assertEqual(self.autocomplete("poké"), ["Pokémon Journeys"])
+        self.assertEqual(self.autocomplete("É"), ["ÉCLAIR"])
+
+
+class PageRegistryTests(TestCase):
+    @mock.patch('forum.models.requests.get')
+    def test_prefetch_outside_registry(self, get):
+        prefetch_soups(["https://example.com/"])
+        ReviewPage.prefetch(["https://example.com/posts/1/"])
+        get.assert_not_called()
+
+    @mock.patch('forum.models.requests.get')
+    def test_prefetch_inside_registry(self, get):
+        get.return_value.text = "<html></html>"
+        with page_registry():
+            prefetch_soups(["https://example.com/", "https://example.com/"])
+            get_soup("https://example.com/")
+        get.assert_called_once_with("https://example.com/")
+
+
+class SearchBackendTests(TestCase):
+    def tearDown(self):
+        forget_search_backends()
+
+    def test_chosen_again_after_migrating(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE forum_fic_fts RENAME TO forum_fic_fts_old")
+        try:
+            forget_search_backends()
+            self.assertIsInstance(get_search_backend(), SubstringSearchBackend)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("ALTER TABLE forum_fic_fts_old RENAME TO forum_fic_fts")
+        # The fallback wasn't remembered
+        self.assertIsInstance(get_search_backend(), SQLiteSearchBackend)
+        choose_search_backends_again(sender=None)
+        self.assertEqual(search._search_backends, {})
+
+
+class TagTests(TestCase):
+    def test_get_or_create_all(self):
+        existing = Tag.objects.create(name="Dragons", slug="dragons")
+        tags = Tag.objects.get_or_create_all(["dragons!", "Found Family"])
+        self.assertEqual(sorted((tag.slug, tag.name) for tag in tags), [("dragons", "Dragons"), ("found-family", "Found Family")])
+        self.assertIn(existing, tags)
+
+    def test_name_without_slug(self):
+        for name in ["?!", "ドラゴン"]:
+            with self.assertRaises(ValueError):
+                Tag.objects.get_or_create_all(["dragons", name])
+        self.assertFalse(Tag.objects.exists())
+
+    def test_catalog_form_rejects_name_without_slug(self):
+        fic = Fic.objects.create(title="The Long Road", thread_id=1, posted_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        form = CatalogFicForm({'tags': "dragons, ?!, ドラゴン"}, instance=fic)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['tags'], ["Tags must contain at least one Latin letter or number: ?!, ドラゴン"])
+        form = CatalogFicForm({'tags': "Dragons, found family,"}, instance=fic)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['tags'], ["dragons", "found-family"])
+
+
+class UnverifiedUserMiddlewareTests(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create(user_id=1, username="Dragonfree")
+        self.temp_user = User.objects.create_user(username="temp", password="temp", member=self.member)
+        self.client.force_login(self.temp_user)
+
+    def test_checked_once_per_session(self):
+        with mock.patch('forum.views.member_has_verified_user', wraps=member_has_verified_user) as check:
+            self.client.get(reverse('autocomplete_member'))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('autocomplete_member'))
+        self.assertEqual(check.call_count, 1)
+        # Only the user itself is loaded, not other users of its member
+        self.assertFalse([query for query in queries if 'WHERE ("forum_user"."member_id"' in query['sql']])
+        self.assertEqual(response.wsgi_request.user, self.temp_user)
+
+    def test_logged_out_once_member_verified(self):
+        self.client.get(reverse('autocomplete_member'))
+        User.objects.create_user(username="real", password="real", member=self.member, verified=True)
+        end_unverified_sessions(self.member.pk)
+        response = self.client.get(reverse('autocomplete_member'))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
 
-# Create your tests here.
+    def test_verified_user_found_on_first_request(self):
+        User.objects.create_user(username="real", password="real", member=self.member, verified=True)
+        response = self.client.get(reverse('autocomplete_member'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertFalse(self.client.get(reverse('autocomplete_member')).wsgi_request.user.is_authenticated)
@@ -1,5 +1,7 @@
 import bbcode
 from django.conf import settings
+from django.db.models import F
+from forum.models import CacheVersion
 
 
 bbcode_formatter = bbcode.Parser()
@@ -11,3 +13,18 @@ def bbcode_to_html(text):
 
 def forum_url_from_path(path):
     return "https://{}{}".format(settings.FORUM_URL.rsplit('/', 1)[0], path)
+
+
+def get_cache_version(key):
+    """
+    Returns the current version stored under the given key, for checking
+    whether something cached elsewhere (e.g. in a process) is still up
+    to date. Versions live in the database, so every process sees a bump.
+
+    """
+    return CacheVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+
+def bump_cache_version(key):
+    CacheVersion.objects.get_or_create(key=key)
+    CacheVersion.objects.filter(key=key).update(version=F('version') + 1)
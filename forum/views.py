@@ -1,23 +1,37 @@
+import hashlib
 import json
 
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.mixins import AccessMixin
 from django.contrib.auth.views import redirect_to_login
 from django.shortcuts import redirect, render
 from django.core.exceptions import ValidationError, PermissionDenied
-from django.http import HttpResponse
+from django.db.models import Q, prefetch_related_objects
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.views.generic.base import View
 from django.views.generic.list import ListView
 from django.views.generic.detail import SingleObjectMixin, DetailView
 from django.views.generic.edit import FormMixin, FormView, CreateView, UpdateView
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
-from forum.models import User, Member, Fic, Genre, get_verification_code
+from forum.models import User, Member, Fic, Genre, Tag, end_unverified_sessions, get_verification_code, member_has_verified_user
 from forum.forms import VerificationForm, RegisterForm, UserInfoForm, UserLookupForm, PasswordResetForm, CatalogSearchForm, CatalogFicForm
+from forum.export import EXPORT_FORMATS
+from forum.search import get_search_backend
+
+
+# The member that the session's unverified user was last found to be the
+# only user of; see UnverifiedUserMiddleware.
+CHECKED_MEMBER_SESSION_KEY = 'unverified_member_checked'
 
 
 class UnverifiedUserMiddleware:
@@ -28,6 +42,9 @@ class UnverifiedUserMiddleware:
     This prevents unverified users from sneaking in to override a
     verified user's votes.
 
+    Each session is only checked once per member: when a member is
+    verified later, end_unverified_sessions logs its temp users out.
+
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -35,13 +52,14 @@ class UnverifiedUserMiddleware:
     def __call__(self, request):
         if request.user.is_authenticated:
             if (
-                request.user.is_authenticated and
-                request.user.member and
+                request.user.member_id is not None and
                 not request.user.verified and
-                User.objects.filter(member=request.user.member, verified=True).exists()
+                request.session.get(CHECKED_MEMBER_SESSION_KEY) != request.user.member_id
             ):
-                logout(request)
-                return redirect(reverse('login'))
+                if member_has_verified_user(request.user.member_id):
+                    logout(request)
+                    return redirect(reverse('login'))
+                request.session[CHECKED_MEMBER_SESSION_KEY] = request.user.member_id
 
         return self.get_response(request)
 
@@ -67,37 +85,117 @@ class LoginRequiredMixin(object):
         return super(LoginRequiredMixin, self).dispatch(*args, **kwargs)
 
 
-class CatalogView(ListView):
+class CatalogRowsMixin(object):
+    """
+    Renders each fic's row in the catalog table from the cache where
+    possible. Rows are keyed on the fic's catalog_updated timestamp, so
+    a changed fic simply gets a new key.
+
+    """
+    row_template_name = "catalog_fic_row.html"
+    row_cache_timeout = 60 * 60 * 24
+
+    def get_row_cache_key(self, fic):
+        return 'catalog_fic_row:%s:%s' % (fic.pk, fic.catalog_updated.timestamp())
+
+    def render_rows(self, fics):
+        keys = [self.get_row_cache_key(fic) for fic in fics]
+        rows = cache.get_many(keys)
+        missing = [(key, fic) for key, fic in zip(keys, fics) if key not in rows]
+        if missing:
+            # Only fetch the related objects for the rows we have to render
+            prefetch_related_objects([fic for key, fic in missing], 'authors', 'genres', 'tags')
+            new_rows = {key: render_to_string(self.row_template_name, {'fic': fic}) for key, fic in missing}
+            cache.set_many(new_rows, self.row_cache_timeout)
+            rows.update(new_rows)
+        return [mark_safe(rows[key]) for key in keys]
+
+
+class CatalogPaginationMixin(CatalogRowsMixin):
+    """
+    Keyset pagination of a catalog listing, ordered by title and ID.
+    Rather than a page number, pages are requested with a cursor
+    encoding the title and ID of the last fic on the previous page (or
+    the first fic on the next page), so any page is as cheap to fetch as
+    the first.
+
+    """
+    fics_per_page = 50
+
+    def encode_cursor(self, fic):
+        return urlsafe_base64_encode(json.dumps([fic.title, fic.pk]).encode('utf-8'))
+
+    def decode_cursor(self, cursor):
+        try:
+            title, pk = json.loads(urlsafe_base64_decode(cursor))
+            return str(title), int(pk)
+        except (ValueError, TypeError):
+            raise Http404("Invalid page.")
+
+    def get_fic_page_context(self, queryset):
+        queryset = queryset.prefetch_related(None).order_by('title', 'pk')
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+
+        if before:
+            title, pk = self.decode_cursor(before)
+            fics = list(queryset.filter(Q(title__lt=title) | Q(title=title, pk__lt=pk)).reverse()[:self.fics_per_page + 1])
+            has_previous, has_next = len(fics) > self.fics_per_page, True
+            fics = fics[:self.fics_per_page][::-1]
+        else:
+            if after:
+                title, pk = self.decode_cursor(after)
+                queryset = queryset.filter(Q(title__gt=title) | Q(title=title, pk__gt=pk))
+            fics = list(queryset[:self.fics_per_page + 1])
+            has_previous, has_next = bool(after), len(fics) > self.fics_per_page
+            fics = fics[:self.fics_per_page]
+
+        return {
+            'fics': fics,
+            'fic_rows': self.render_rows(fics),
+            'previous_cursor': self.encode_cursor(fics[0]) if fics and has_previous else None,
+            'next_cursor': self.encode_cursor(fics[-1]) if fics and has_next else None,
+        }
+
+
+class CatalogView(CatalogPaginationMixin, ListView):
     template_name = "catalog.html"
     context_object_name = "fics"
 
     def get_queryset(self):
-        return Fic.objects.order_by('title')
+        return Fic.objects.all()
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(form=CatalogSearchForm())
+        return super().get_context_data(form=CatalogSearchForm(), **self.get_fic_page_context(self.object_list))
 
 
-class CatalogGenreView(DetailView):
+class CatalogGenreView(CatalogPaginationMixin, DetailView):
     template_name = "catalog_genre.html"
     model = Genre
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(fics=self.object.fics.order_by('title'), **kwargs)
+        return super().get_context_data(**self.get_fic_page_context(self.object.fics.all()), **kwargs)
 
 
-class CatalogTagView(ListView):
+class CatalogTagView(CatalogPaginationMixin, DetailView):
     template_name = "catalog_tag.html"
-    context_object_name = "fics"
-
-    def get_queryset(self):
-        return Fic.objects.filter(tags__tag=self.kwargs.get('tag'))
+    model = Tag
+    slug_url_kwarg = 'tag'
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(tag=self.kwargs.get('tag'), **kwargs)
+        return super().get_context_data(**self.get_fic_page_context(self.object.fics.all()), **kwargs)
+
+
+class CatalogTagListView(ListView):
+    template_name = "catalog_tags.html"
+    context_object_name = "tags"
+    paginate_by = 200
+
+    def get_queryset(self):
+        return Tag.objects.filter(fic_count__gt=0).order_by('-fic_count', 'slug')
 
 
-class CatalogAuthorView(DetailView):
+class CatalogAuthorView(CatalogPaginationMixin, DetailView):
     template_name = "catalog_author.html"
     model = Member
 
@@ -105,7 +203,7 @@ class CatalogAuthorView(DetailView):
         return Member.objects.get(user_id=self.kwargs.get('member'))
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(fics=self.object.fics.order_by('title'), **kwargs)
+        return super().get_context_data(**self.get_fic_page_context(self.object.fics.all()), **kwargs)
 
 
 class CatalogFicView(UpdateView):
@@ -123,9 +221,10 @@ class CatalogFicView(UpdateView):
         return reverse('catalog_fic', kwargs={'pk': self.object.pk})
 
 
-class CatalogSearchView(ListView):
+class CatalogSearchView(CatalogRowsMixin, ListView):
     template_name = "catalog_search.html"
     context_object_name = "fics"
+    paginate_by = 50
 
     def get(self, request, *args, **kwargs):
         self.form = CatalogSearchForm(request.GET)
@@ -135,7 +234,32 @@ class CatalogSearchView(ListView):
         return self.form.get_results()
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(form=self.form, **kwargs)
+        query_string = self.request.GET.copy()
+        query_string.pop('page', None)
+        context = super().get_context_data(form=self.form, query_string=query_string.urlencode(), **kwargs)
+        context['fic_rows'] = self.render_rows(context['fics'])
+        return context
+
+
+class CatalogExportView(View):
+    """
+    Streams the whole catalog to staff as JSON lines (the default) or
+    CSV, chosen with the format parameter.
+
+    """
+    def dispatch(self, *args, **kwargs):
+        if not self.request.user.is_staff:
+            raise PermissionDenied
+        return super().dispatch(*args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'jsonl')
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Unknown export format.")
+        export, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(export(), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="catalog.%s"' % export_format
+        return response
 
 
 class RegisterView(CreateView):
@@ -181,6 +305,8 @@ class VerificationView(LoginRequiredMixin, FormView):
         self.request.user.member = form.member
         self.request.user.verified = True
         self.request.user.save()
+        self.request.session.pop(CHECKED_MEMBER_SESSION_KEY, None)
+        end_unverified_sessions(form.member.pk)
         messages.success(self.request, ("You have been successfully verified as %s!" % form.member) + ("You can change your 'About you' profile field on the forums back now, if you like." if not hasattr(settings, 'FORUM_API_KEY') else ""))
         return super(VerificationView, self).form_valid(form)
 
@@ -264,6 +390,72 @@ class ForumObjectLookupView(JSONViewMixin, View):
         return self.render_to_json_response(context)
 
 
+class AutocompleteView(JSONViewMixin, View):
+    """
+    Typeahead lookups of objects by name, for widgets that load their
+    options on demand. Takes either a search term (q) or one or more
+    primary keys (pk) of objects to fetch.
+
+    """
+    model = None
+    queryset = None
+    field = None
+    min_length = 2
+    default_limit = 10
+    max_limit = 25
+    max_pks = 200
+    cache_timeout = 60
+
+    def get_queryset(self):
+        if self.queryset is not None:
+            return self.queryset.all()
+        return self.model.objects.all()
+
+    def get_limit(self):
+        try:
+            return max(1, min(int(self.request.GET.get('limit', self.default_limit)), self.max_limit))
+        except ValueError:
+            return self.default_limit
+
+    def get_objects(self, term, limit):
+        return list(get_search_backend().autocomplete(self.get_queryset(), self.field, term)[:limit])
+
+    def get_objects_by_pk(self, pks):
+        try:
+            pks = [int(pk) for pk in pks]
+        except ValueError:
+            return []
+        return list(self.get_queryset().filter(pk__in=pks[:self.max_pks]))
+
+    def to_context(self, objects):
+        other_objects = {}
+        for obj in objects:
+            if isinstance(obj, Fic):
+                for author in obj.authors.all():
+                    other_objects[author.pk] = author.to_dict()
+        return {'results': [obj.to_dict() for obj in objects], 'other_objects': list(other_objects.values())}
+
+    def get(self, *args, **kwargs):
+        pks = self.request.GET.getlist('pk')
+        if pks:
+            return self.render_to_json_response(self.to_context(self.get_objects_by_pk(pks)))
+
+        term = ' '.join(self.request.GET.get('q', '').split())
+        if len(term) < self.min_length:
+            return self.render_to_json_response(self.to_context([]))
+
+        limit = self.get_limit()
+        cache_key = 'autocomplete:%s:%s:%s' % (self.request.path, limit, hashlib.md5(term.lower().encode('utf-8')).hexdigest())
+        context = cache.get(cache_key)
+        if context is None:
+            context = self.to_context(self.get_objects(term, limit))
+            cache.set(cache_key, context, self.cache_timeout)
+
+        response = self.render_to_json_response(context)
+        patch_cache_control(response, max_age=self.cache_timeout)
+        return response
+
+
 class VerificationRequiredMixin(AccessMixin):
     def dispatch(self, request, *args, **kwargs):
         if not request.user.verified:
@@ -1,6 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.forms.models import BaseInlineFormSet
-from reviewblitz.models import ReviewBlitzScoring, ReviewBlitz, BlitzReview, BlitzUser, ReviewBlitzTheme, WeeklyTheme
+from django.urls import re_path
+from forum.models import pretty_join
+from reviewblitz.models import ReviewBlitzScoring, ReviewBlitz, BlitzReview, BlitzUser, PointsEntry, ReviewBlitzTheme, WeeklyTheme
+from reviewblitz.views import ScoringSimulationView
 
 class WeeklyThemeAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
@@ -17,8 +20,32 @@ class BlitzThemeInline(admin.TabularInline):
     max_num = 5
 
 class ReviewBlitzAdmin(admin.ModelAdmin):
-    list_display = ['title', 'start_date', 'end_date']
+    list_display = ['title', 'start_date', 'end_date', 'finalized_date']
     inlines = [BlitzThemeInline]
+    actions = ['update_leaderboard', 'finalize']
+
+    @admin.action(description="Recalculate leaderboard")
+    def update_leaderboard(self, request, queryset):
+        for blitz in queryset.select_related('scoring'):
+            blitz.update_leaderboard()
+        self.message_user(request, "Recalculated %s leaderboard(s)." % len(queryset))
+
+    @admin.action(description="Freeze final standings")
+    def finalize(self, request, queryset):
+        blitzes = list(queryset.select_related('scoring'))
+        finished = [blitz for blitz in blitzes if blitz.is_finished()]
+        for blitz in finished:
+            blitz.finalize()
+        self.message_user(request, "Froze the final standings of %s Blitz(es)." % len(finished))
+        if len(finished) < len(blitzes):
+            self.message_user(request, "%s hasn't finished yet." % pretty_join([str(blitz) for blitz in blitzes if not blitz.is_finished()]), messages.WARNING)
+
+    def get_urls(self):
+        urls = super().get_urls()
+
+        return [
+            re_path(r'^simulate_scoring/$', self.admin_site.admin_view(ScoringSimulationView.as_view(extra_context={'current_app': self.admin_site.name})), name='simulate_scoring')
+        ] + urls
 
 class BlitzReviewAdmin(admin.ModelAdmin):
     list_display = ['author', 'fic', 'chapters', 'theme', 'approved', 'score', 'edit']
@@ -44,12 +71,37 @@ class BlitzReviewAdmin(admin.ModelAdmin):
         return obj.review.chapters
 
 class BlitzUserAdmin(admin.ModelAdmin):
-    list_display = ['member', 'blitz', 'bonus_points', 'points_spent']
+    list_display = ['member', 'blitz', 'bonus_points', 'points_spent', 'points']
     list_filter = ['blitz']
     search_fields = ['member']
 
+class PointsEntryAdmin(admin.ModelAdmin):
+    list_display = ['date', 'member', 'blitz', 'kind', 'points', 'points_total', 'spent_total', 'blitz_review_id', 'note']
+    list_filter = ['user__blitz', 'kind']
+    list_select_related = ['user__member', 'user__blitz']
+    search_fields = ['user__member__username']
+
+    @admin.display(ordering='user__member__username')
+    def member(self, obj):
+        return obj.user.member
+
+    @admin.display(ordering='user__blitz__start_date')
+    def blitz(self, obj):
+        return obj.user.blitz
+
+    # The ledger is append-only; entries are made by the leaderboard updates
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 admin.site.register(ReviewBlitzScoring)
 admin.site.register(ReviewBlitz, ReviewBlitzAdmin)
 admin.site.register(BlitzReview, BlitzReviewAdmin)
 admin.site.register(BlitzUser, BlitzUserAdmin)
+admin.site.register(PointsEntry, PointsEntryAdmin)
 admin.site.register(WeeklyTheme, WeeklyThemeAdmin)
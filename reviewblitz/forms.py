@@ -1,9 +1,14 @@
 from django import forms
 from django.forms.formsets import formset_factory
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from forum.forms import ForumLinkField, ForumObjectField
-from forum.models import ReviewPage, ChapterPage, MemberPage
-from reviewblitz.models import BlitzReview, ReviewBlitz
+from forum.models import Chapter, Review, ReviewPage, ChapterPage, MemberPage, page_registry
+from reviewblitz.models import BlitzReview, ReviewBlitz, ReviewBlitzScoring
+from reviewblitz.simulation import SIMULATED_FIELDS, build_grid, parse_values
+
+# The most scoring systems the admin simulation will try at once.
+MAX_SIMULATED_CONFIGS = 10000
 
 
 class HasReviewedForm(forms.Form):
@@ -14,7 +19,7 @@ class HasReviewedForm(forms.Form):
 class ReviewField(forms.Field):
     def to_python(self, value):
         try:
-            review = ReviewPage.from_url(value, force_download=True).object
+            review = ReviewPage.from_url(value).object
         except ValueError as e:
             raise ValidationError("Invalid review URL", code="invalid") from e
 
@@ -39,6 +44,7 @@ class BlitzReviewSubmissionForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop("user", None)
+        self.blitz = kwargs.pop("blitz", None) or ReviewBlitz.get_current()
         super(BlitzReviewSubmissionForm, self).__init__(*args, **kwargs)
 
         formset_prefix = "chapter_links"
@@ -46,10 +52,53 @@ class BlitzReviewSubmissionForm(forms.Form):
             formset_prefix = kwargs["prefix"] + "-" + formset_prefix
         self.chapter_link_formset = ChapterLinkFormSet(prefix=formset_prefix, data=kwargs.get('data'))
 
+    def full_clean(self):
+        # Fetch every page the review and chapter links need at once,
+        # rather than one after another as each field is cleaned.
+        with page_registry():
+            if self.is_bound:
+                ReviewPage.prefetch(self.get_new_post_urls())
+            super().full_clean()
+
+    def get_new_post_urls(self):
+        """
+        Returns the entered links that will have to be fetched from the
+        forums: the review and chapters, unless we fetched them recently.
+
+        """
+        review_url = self.data.get(self.add_prefix('review'))
+        urls = [(Review, review_url)] if review_url else []
+        for form in self.chapter_link_formset:
+            chapter_pk, chapter_url = form['chapter'].value()[:2]
+            if chapter_url and not chapter_pk:
+                urls.append((Chapter, chapter_url.strip()))
+
+        post_ids = {}
+        for model, url in urls:
+            try:
+                post_ids[url] = int(model.get_page_class().get_params_from_url(url)['post_id'])
+            except ValueError:
+                # The field will complain about this
+                pass
+        fresh = {
+            (model, post_id) for model in (Review, Chapter)
+            for post_id in model.objects.filter(pk__in=post_ids.values(), fetched_at__gte=timezone.now() - model.fresh_for).values_list('pk', flat=True)
+        }
+        return [url for model, url in urls if url in post_ids and (model, post_ids[url]) not in fresh]
+
+    def get_review_post_id(self):
+        """
+        Returns the post ID from the entered review link, without
+        fetching anything, or None if it isn't a valid review link.
+
+        """
+        try:
+            return int(Review.get_page_class().get_params_from_url(self.data.get(self.add_prefix('review')) or '')['post_id'])
+        except ValueError:
+            return None
+
     def clean_review(self):
         review = self.cleaned_data["review"]
-        print(f"Review author: {review.author=}")
-        print(f"User: {self.user.member=}")
         if review.author != self.user.member:
             author = review.author
             raise ValidationError(
@@ -57,7 +106,10 @@ class BlitzReviewSubmissionForm(forms.Form):
                 code="forbidden",
                 params={"author": author}
             )
-        blitz = ReviewBlitz.get_current()
+        blitz = self.blitz
+        if review.word_count < blitz.scoring.min_words and not review._state.adding:
+            # We had this review stored, but it may have been edited since
+            review = ReviewPage.from_url(review.link(), force_download=True).object
         if review.word_count < blitz.scoring.min_words:
             raise ValidationError("This review does not meet the minimum word count for this Review Blitz! Please submit a review at least {} words long.".format(blitz.scoring.min_words))
         if review.posted_date < blitz.start_date:
@@ -69,7 +121,7 @@ class BlitzReviewSubmissionForm(forms.Form):
     def clean(self):
         cleaned_data = super().clean()
 
-        blitz = ReviewBlitz.get_current()
+        blitz = self.blitz
 
         if not blitz.is_active():
             self.add_error(None, "This Blitz is not currently active! Come back for the next Review Blitz.")
@@ -94,3 +146,31 @@ class BlitzReviewSubmissionForm(forms.Form):
         is_valid = super().is_valid()
         formset_is_valid = self.chapter_link_formset.is_valid()
         return is_valid and formset_is_valid
+
+
+class ScoringSimulationForm(forms.Form):
+    blitz = forms.ModelChoiceField(ReviewBlitz.objects.select_related('scoring').prefetch_related('weekly_themes__theme').order_by('-start_date'), empty_label=None)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name in SIMULATED_FIELDS:
+            field = ReviewBlitzScoring._meta.get_field(field_name)
+            self.fields[field_name] = forms.CharField(label=field.verbose_name.capitalize(), required=False, help_text="Comma-separated values to try, or blank for the Blitz's own value.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        values = {}
+        for field_name in SIMULATED_FIELDS:
+            try:
+                values[field_name] = parse_values(field_name, cleaned_data.get(field_name, ""))
+            except ValidationError as e:
+                self.add_error(field_name, e)
+
+        if "blitz" in cleaned_data:
+            cleaned_data["varied"] = [field_name for field_name in SIMULATED_FIELDS if values.get(field_name)]
+            cleaned_data["grid"] = build_grid(cleaned_data["blitz"].scoring, values)
+            if len(cleaned_data["grid"]) > MAX_SIMULATED_CONFIGS + 1:
+                raise ValidationError("That's %d scoring systems; please try no more than %d at once." % (len(cleaned_data["grid"]) - 1, MAX_SIMULATED_CONFIGS))
+
+        return cleaned_data
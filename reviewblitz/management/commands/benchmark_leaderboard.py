@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from forum.models import Fic, Member, Review
+from reviewblitz.models import WEEK_SECONDS, BlitzReview, BlitzUser, ReviewBlitz, ReviewBlitzScoring
+
+
+class Command(BaseCommand):
+    help = "Times the leaderboard queries on a large synthetic Review Blitz. Nothing is saved: the Blitz is created in a transaction that is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000, help="The number of participants (default: 5000).")
+        parser.add_argument('--reviews', type=int, default=50000, help="The number of reviews (default: 50000).")
+        parser.add_argument('--repeat', type=int, default=5, help="How many times to run each query; the best time is shown (default: 5).")
+        parser.add_argument('--seed', type=int, default=0, help="The random seed for the synthetic data.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            blitz = self.create_blitz(options['users'], options['reviews'], random.Random(options['seed']))
+            self.stdout.write("Created a Blitz with %d participants and %d reviews in %.2fs." % (options['users'], options['reviews'], time.perf_counter() - start))
+
+            self.time("update_leaderboard", blitz.update_leaderboard, 1)
+            leaderboard = self.time("leaderboard", lambda: list(blitz.get_leaderboard()), options['repeat'])
+            by_week = self.time("one aggregation per week", lambda: self.points_by_week(blitz), options['repeat'])
+
+            mismatches = sum(1 for entry in leaderboard if [Decimal(points) for points in entry.weekly_points] != [by_week[week].get(entry.member_id, 0) for week in blitz.weeks()])
+            self.stdout.write("Weekly points differing between the two: %d" % mismatches)
+            transaction.set_rollback(True)
+
+    def time(self, name, function, repeat):
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write("%s: %.3fs" % (name, min(timings)))
+        return result
+
+    def points_by_week(self, blitz):
+        """
+        The weekly breakdown worked out with one aggregation per week,
+        to check the stored breakdown against.
+
+        """
+        week = timedelta(seconds=WEEK_SECONDS)
+        results = {}
+        for n in blitz.weeks():
+            reviews = blitz.blitz_reviews.filter(approved=True, review__posted_date__lt=blitz.start_date + n * week)
+            if n == 1:
+                reviews = reviews.filter(review__posted_date__gt=blitz.start_date - week)
+            else:
+                reviews = reviews.filter(review__posted_date__gte=blitz.start_date + (n - 1) * week)
+            results[n] = dict(reviews.values('review__author').annotate(points=Sum('score')).values_list('review__author', 'points').order_by())
+        return results
+
+    def create_blitz(self, n_users, n_reviews, rng):
+        now = timezone.now()
+        scoring = ReviewBlitzScoring.objects.create(
+            name="Benchmark", min_words=250, words_per_chapter=500, chapter_points=1, consecutive_chapter_interval=5,
+            consecutive_chapter_bonus=1, theme_bonus=Decimal('0.5'), long_chapter_bonus_words=5000, long_chapter_bonus=Decimal('0.5'),
+            heat_bonus_multiplier=1, max_heat_bonus_tier_0=Decimal('0.5'), max_heat_bonus_tier_1=1, max_heat_bonus=2
+        )
+        blitz = ReviewBlitz.objects.create(title="Benchmark", start_date=now - timedelta(days=35), end_date=now, scoring=scoring)
+
+        first_id = (Member.objects.aggregate(Max('user_id'))['user_id__max'] or 0) + 1
+        members = Member.objects.bulk_create([Member(user_id=first_id + i, username="benchmark%d" % i) for i in range(n_users)])
+        BlitzUser.objects.bulk_create([BlitzUser(blitz=blitz, member=member) for member in members])
+
+        fics = Fic.objects.bulk_create([Fic(title="Benchmark fic %d" % i, thread_id=i + 1, posted_date=blitz.start_date) for i in range(n_users // 2)])
+        fics = list(Fic.objects.filter(title__startswith="Benchmark fic ").order_by('-pk')[:len(fics)])
+        Fic.authors.through.objects.bulk_create([Fic.authors.through(fic=fic, member=rng.choice(members)) for fic in fics])
+
+        first_id = (Review.objects.aggregate(Max('post_id'))['post_id__max'] or 0) + 1
+        reviews = Review.objects.bulk_create([
+            Review(
+                post_id=first_id + i, author=rng.choice(members), fic=rng.choice(fics), chapters=rng.randint(1, 5),
+                word_count=rng.randint(250, 5000), posted_date=blitz.start_date + timedelta(seconds=rng.randrange(35 * 24 * 60 * 60))
+            ) for i in range(n_reviews)
+        ], batch_size=1000)
+        BlitzReview.objects.bulk_create([
+            BlitzReview(
+                blitz=blitz, review=review, score=Decimal(rng.randint(2, 40)) / 4, approved=rng.random() < 0.9,
+                effective_chapters=min(review.word_count // scoring.words_per_chapter, review.chapters)
+            ) for review in reviews
+        ], batch_size=1000)
+        return blitz
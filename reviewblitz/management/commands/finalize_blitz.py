@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from reviewblitz.models import ReviewBlitz
+
+
+class Command(BaseCommand):
+    help = "Freezes the final standings of finished Review Blitzes, so their pages no longer recalculate the leaderboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('blitz_ids', nargs='*', type=int, help="The IDs of the Blitzes to finalize (default: every finished Blitz that hasn't been finalized yet).")
+
+    def handle(self, *args, **options):
+        blitzes = ReviewBlitz.objects.select_related('scoring').order_by('start_date')
+        if options['blitz_ids']:
+            blitzes = blitzes.filter(pk__in=options['blitz_ids'])
+            if len(blitzes) != len(set(options['blitz_ids'])):
+                raise CommandError("No such Blitz: %s" % ', '.join(str(pk) for pk in set(options['blitz_ids']) - {blitz.pk for blitz in blitzes}))
+            unfinished = [blitz for blitz in blitzes if not blitz.is_finished()]
+            if unfinished:
+                raise CommandError("Not finished yet: %s" % ', '.join(str(blitz) for blitz in unfinished))
+        else:
+            blitzes = blitzes.filter(end_date__lte=timezone.now(), final_standings__isnull=True)
+
+        for blitz in blitzes:
+            blitz.finalize()
+            self.stdout.write("%s: froze %d leaderboard entr%s." % (blitz, len(blitz.final_standings), 'y' if len(blitz.final_standings) == 1 else 'ies'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from reviewblitz.models import ReviewBlitz
+
+COUNTER_FIELDS = ('points', 'reviews', 'chapters', 'words', 'effective_chapters', 'effective_chapters_received', 'heat_bonus')
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored effective chapters and leaderboard stats of Review Blitzes from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('blitz_ids', nargs='*', type=int, help="The IDs of the Blitzes to reconcile (default: all of them).")
+
+    def handle(self, *args, **options):
+        blitzes = ReviewBlitz.objects.select_related('scoring').order_by('start_date')
+        if options['blitz_ids']:
+            blitzes = blitzes.filter(pk__in=options['blitz_ids'])
+            if len(blitzes) != len(set(options['blitz_ids'])):
+                raise CommandError("No such Blitz: %s" % ', '.join(str(pk) for pk in set(options['blitz_ids']) - {blitz.pk for blitz in blitzes}))
+
+        for blitz in blitzes:
+            before = {user[0]: user[1:] for user in blitz.blitzes.values_list('pk', *COUNTER_FIELDS)}
+            with transaction.atomic():
+                reviews_fixed = blitz.update_effective_chapters()
+                blitz.update_leaderboard()
+            after = blitz.blitzes.values_list('pk', *COUNTER_FIELDS)
+            users_fixed = sum(1 for user in after if before.get(user[0]) != user[1:])
+            self.stdout.write("%s: corrected %d review(s) and %d leaderboard entr%s." % (blitz, reviews_fixed, users_fixed, 'y' if users_fixed == 1 else 'ies'))
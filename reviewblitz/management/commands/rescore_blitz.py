@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from reviewblitz.models import BlitzReview, ReviewBlitz
+from reviewblitz.scoring import rescore_blitz
+
+
+class Command(BaseCommand):
+    help = "Recalculates the scores of every review in a Review Blitz using its current scoring system."
+
+    def add_arguments(self, parser):
+        parser.add_argument('blitz_id', nargs='?', type=int, help="The ID of the Blitz to rescore (default: the current one).")
+        parser.add_argument('--dry-run', action='store_true', help="Show the score changes without saving them.")
+
+    def handle(self, *args, **options):
+        blitzes = ReviewBlitz.objects.select_related('scoring').prefetch_related('weekly_themes__theme')
+        try:
+            if options['blitz_id'] is None:
+                blitz = blitzes.latest('start_date')
+            else:
+                blitz = blitzes.get(pk=options['blitz_id'])
+        except ReviewBlitz.DoesNotExist:
+            raise CommandError("No such Blitz.")
+
+        with transaction.atomic():
+            changed = []
+            for blitzreview, old_score, old_theme in rescore_blitz(blitz):
+                if blitzreview.score != old_score or blitzreview.theme != old_theme:
+                    changed.append(blitzreview)
+                    self.stdout.write("%s (%s): %s -> %s%s" % (
+                        blitzreview, 'approved' if blitzreview.approved else 'pending', old_score, blitzreview.score,
+                        '' if blitzreview.theme == old_theme else ', theme bonus %s' % ('claimed' if blitzreview.theme else 'lost')
+                    ))
+
+            if options['dry_run']:
+                self.stdout.write("%d review(s) would be rescored." % len(changed))
+                return
+
+            BlitzReview.objects.bulk_update(changed, ['score', 'theme'])
+            blitz.update_leaderboard()
+        self.stdout.write("Rescored %d review(s) in %s." % (len(changed), blitz))
@@ -0,0 +1,53 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from reviewblitz.models import ReviewBlitz
+from reviewblitz.simulation import SIMULATED_FIELDS, BlitzSimulation, build_grid, parse_values
+
+
+class Command(BaseCommand):
+    help = "Shows how a past Review Blitz's leaderboard would have turned out under different scoring systems."
+
+    def add_arguments(self, parser):
+        parser.add_argument('blitz_id', nargs='?', type=int, help="The ID of the Blitz to simulate (default: the latest one).")
+        parser.add_argument(
+            '--vary', action='append', default=[], metavar='FIELD=VALUES',
+            help="Comma-separated values to try for a scoring field, e.g. chapter_points=1,1.5,2. Every combination of the given values is tried."
+        )
+
+    def handle(self, *args, **options):
+        values = {}
+        for vary in options['vary']:
+            field, _, text = vary.partition('=')
+            if field not in SIMULATED_FIELDS:
+                raise CommandError("Can't vary '%s'; choose from %s." % (field, ', '.join(SIMULATED_FIELDS)))
+            try:
+                values[field] = parse_values(field, text)
+            except ValidationError as e:
+                raise CommandError("%s: %s" % (field, ' '.join(e.messages)))
+
+        blitzes = ReviewBlitz.objects.select_related('scoring').prefetch_related('weekly_themes__theme')
+        try:
+            if options['blitz_id'] is None:
+                blitz = blitzes.latest('start_date')
+            else:
+                blitz = blitzes.get(pk=options['blitz_id'])
+        except ReviewBlitz.DoesNotExist:
+            raise CommandError("No such Blitz.")
+
+        simulation = BlitzSimulation(blitz)
+        grid = build_grid(blitz.scoring, values)
+        results = simulation.simulate(grid)
+        if not results:
+            self.stdout.write("%s has no approved reviews to simulate." % blitz)
+            return
+
+        varied = [field for field in SIMULATED_FIELDS if field in values]
+        self.stdout.write("%s: %d reviews, %d scoring systems. Rank changes are relative to the current scoring system (first row)." % (blitz, len(simulation), len(grid)))
+        self.stdout.write('\t'.join(varied + ['moved', 'max move', 'min', 'median', 'mean', 'max', 'std', 'top 3']))
+        for result in results:
+            self.stdout.write('\t'.join(
+                [str(result['config'][field]) for field in varied]
+                + [str(result['rank_changes']), str(result['max_rank_change'])]
+                + ['%.2f' % result[stat] for stat in ('min', 'median', 'mean', 'max', 'std')]
+                + [', '.join(member.username for member in result['leaders'])]
+            ))
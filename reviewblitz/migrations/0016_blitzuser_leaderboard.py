@@ -0,0 +1,90 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:36
+
+import decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Least
+
+
+def fill_leaderboard(apps, schema_editor):
+    # A copy of ReviewBlitz.update_leaderboard as of this migration.
+    ReviewBlitz = apps.get_model('reviewblitz', 'ReviewBlitz')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    BlitzUser = apps.get_model('reviewblitz', 'BlitzUser')
+    for blitz in ReviewBlitz.objects.select_related('scoring'):
+        scoring = blitz.scoring
+        effective_chapters = Sum(Least(F('review__chapters'), F('review__word_count') / scoring.words_per_chapter))
+        approved_reviews = BlitzReview.objects.filter(blitz=blitz, approved=True)
+        given = {
+            stats['review__author']: stats for stats in approved_reviews.values('review__author').annotate(
+                points=Sum('score'), reviews=Count('id'), chapters=Sum('review__chapters'), words=Sum('review__word_count'), effective_chapters=effective_chapters
+            )
+        }
+        received = dict(approved_reviews.values('review__fic__authors').annotate(effective_chapters=effective_chapters).values_list('review__fic__authors', 'effective_chapters'))
+        for user in BlitzUser.objects.filter(blitz=blitz):
+            stats = given.get(user.member_id, {})
+            chapters_given = stats.get('effective_chapters') or 0
+            chapters_received = received.get(user.member_id) or 0
+            max_heat_bonus = scoring.max_heat_bonus_tier_0 if chapters_given < scoring.heat_bonus_threshold_tier_1 else scoring.max_heat_bonus_tier_1 if chapters_given < scoring.heat_bonus_threshold_tier_2 else scoring.max_heat_bonus
+            base_bonus = (chapters_given + 1) / (chapters_received + 1) - 1
+            heat_bonus = 0 if base_bonus < 0 else max_heat_bonus if base_bonus > max_heat_bonus else decimal.Decimal(int(base_bonus * 2 + 0.5)) / 2
+            BlitzUser.objects.filter(pk=user.pk).update(
+                points=(stats.get('points') or 0) + user.bonus_points,
+                reviews=stats.get('reviews', 0),
+                chapters=stats.get('chapters') or 0,
+                words=stats.get('words') or 0,
+                effective_chapters=chapters_given,
+                effective_chapters_received=chapters_received,
+                heat_bonus=heat_bonus
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0018_tag'),
+        ('reviewblitz', '0015_alter_reviewblitzscoring_max_heat_bonus_tier_1'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blitzuser',
+            name='chapters',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='effective_chapters',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='effective_chapters_received',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='heat_bonus',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='points',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='reviews',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blitzuser',
+            name='words',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='blitzuser',
+            index=models.Index(fields=['blitz', '-points', 'id'], name='reviewblitz_leaderboard'),
+        ),
+        migrations.RunPython(fill_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Least
+
+
+def fill_effective_chapters(apps, schema_editor):
+    # A copy of ReviewBlitz.update_effective_chapters as of this migration.
+    ReviewBlitz = apps.get_model('reviewblitz', 'ReviewBlitz')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    Review = apps.get_model('forum', 'Review')
+    review = Review.objects.filter(pk=OuterRef('review'))
+    for blitz in ReviewBlitz.objects.select_related('scoring'):
+        BlitzReview.objects.filter(blitz=blitz).update(effective_chapters=Least(
+            Subquery(review.values('chapters')), Subquery(review.values('word_count')) / blitz.scoring.words_per_chapter
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0016_blitzuser_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blitzreview',
+            name='effective_chapters',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_effective_chapters, migrations.RunPython.noop),
+    ]
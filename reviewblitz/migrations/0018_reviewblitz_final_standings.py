@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:55
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0017_blitzreview_effective_chapters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewblitz',
+            name='final_standings',
+            field=models.JSONField(blank=True, editable=False, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddField(
+            model_name='reviewblitz',
+            name='finalized_date',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0018_reviewblitz_final_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewblitz',
+            name='leaderboard_updated',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reviewblitz',
+            name='leaderboard_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
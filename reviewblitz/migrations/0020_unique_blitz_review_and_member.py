@@ -0,0 +1,90 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:07
+
+import decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def update_leaderboard(apps, blitz, members):
+    # A copy of ReviewBlitz.update_leaderboard as of this migration.
+    ReviewBlitz = apps.get_model('reviewblitz', 'ReviewBlitz')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    BlitzUser = apps.get_model('reviewblitz', 'BlitzUser')
+    scoring = blitz.scoring
+    approved_reviews = BlitzReview.objects.filter(blitz=blitz, approved=True)
+    given = {
+        stats['review__author']: stats for stats in approved_reviews.filter(review__author__in=members).values('review__author').annotate(
+            points=Sum('score'), reviews=Count('id'), chapters=Sum('review__chapters'), words=Sum('review__word_count'), effective_chapters=Sum('effective_chapters')
+        )
+    }
+    received = dict(approved_reviews.filter(review__fic__authors__in=members).values('review__fic__authors').annotate(effective_chapters=Sum('effective_chapters')).values_list('review__fic__authors', 'effective_chapters'))
+    for user in BlitzUser.objects.filter(blitz=blitz, member__in=members):
+        stats = given.get(user.member_id, {})
+        chapters_given = stats.get('effective_chapters') or 0
+        chapters_received = received.get(user.member_id) or 0
+        max_heat_bonus = scoring.max_heat_bonus_tier_0 if chapters_given < scoring.heat_bonus_threshold_tier_1 else scoring.max_heat_bonus_tier_1 if chapters_given < scoring.heat_bonus_threshold_tier_2 else scoring.max_heat_bonus
+        base_bonus = (chapters_given + 1) / (chapters_received + 1) - 1
+        heat_bonus = 0 if base_bonus < 0 else max_heat_bonus if base_bonus > max_heat_bonus else decimal.Decimal(int(base_bonus * 2 + 0.5)) / 2
+        BlitzUser.objects.filter(pk=user.pk).update(
+            points=(stats.get('points') or 0) + user.bonus_points,
+            reviews=stats.get('reviews', 0),
+            chapters=stats.get('chapters') or 0,
+            words=stats.get('words') or 0,
+            effective_chapters=chapters_given,
+            effective_chapters_received=chapters_received,
+            heat_bonus=heat_bonus
+        )
+    ReviewBlitz.objects.filter(pk=blitz.pk).update(leaderboard_version=F('leaderboard_version') + 1)
+
+
+def remove_duplicates(apps, schema_editor):
+    # Concurrent submissions could create the same Blitz review or
+    # participant twice. Keep the first of each; a participant's
+    # duplicates' bonus points and points spent are added to it.
+    # The leaderboard stats of everyone affected are then recalculated,
+    # as they counted the duplicates.
+    ReviewBlitz = apps.get_model('reviewblitz', 'ReviewBlitz')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    BlitzUser = apps.get_model('reviewblitz', 'BlitzUser')
+    Review = apps.get_model('forum', 'Review')
+    affected = {}
+    duplicates = BlitzReview.objects.values('blitz', 'review').annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        BlitzReview.objects.filter(blitz=duplicate['blitz'], review=duplicate['review']).exclude(id=duplicate['first']).delete()
+        review = Review.objects.get(pk=duplicate['review'])
+        # The reviewer's stats and the reviewed authors' received chapters
+        affected.setdefault(duplicate['blitz'], set()).update([review.author_id, *review.fic.authors.values_list('pk', flat=True)])
+
+    duplicates = BlitzUser.objects.values('blitz', 'member').annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        users = list(BlitzUser.objects.filter(blitz=duplicate['blitz'], member=duplicate['member']).order_by('id'))
+        first = users[0]
+        for user in users[1:]:
+            first.bonus_points += user.bonus_points
+            first.points_spent += user.points_spent
+            user.delete()
+        first.save()
+        affected.setdefault(duplicate['blitz'], set()).add(duplicate['member'])
+
+    for blitz in ReviewBlitz.objects.filter(pk__in=affected).select_related('scoring'):
+        update_leaderboard(apps, blitz, affected[blitz.pk])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0021_chapter_fetched_at_review_fetched_at'),
+        ('reviewblitz', '0019_reviewblitz_leaderboard_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='blitzreview',
+            constraint=models.UniqueConstraint(fields=('blitz', 'review'), name='reviewblitz_unique_blitz_review'),
+        ),
+        migrations.AddConstraint(
+            model_name='blitzuser',
+            constraint=models.UniqueConstraint(fields=('blitz', 'member'), name='reviewblitz_unique_blitz_member'),
+        ),
+    ]
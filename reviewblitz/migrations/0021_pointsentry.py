@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:11
+
+import decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    # Each existing participant's ledger opens with their points as they
+    # stand: one entry per approved review (not broken down, as its
+    # scoring may have changed since), then their bonus points and
+    # points spent. Later changes are entered against these.
+    BlitzUser = apps.get_model('reviewblitz', 'BlitzUser')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    PointsEntry = apps.get_model('reviewblitz', 'PointsEntry')
+    scores = {}
+    for blitz_id, member_id, blitz_review_id, score in BlitzReview.objects.filter(approved=True).order_by('id').values_list('blitz', 'review__author', 'id', 'score'):
+        scores.setdefault((blitz_id, member_id), []).append((blitz_review_id, score))
+
+    entries = []
+    for user in BlitzUser.objects.order_by('id').iterator():
+        points_total = spent_total = decimal.Decimal(0)
+        for blitz_review_id, score in scores.get((user.blitz_id, user.member_id), []):
+            points_total += score
+            entries.append(PointsEntry(user=user, blitz_review_id=blitz_review_id, kind='adjustment', points=score, points_total=points_total, spent_total=spent_total, note="Opening balance"))
+        if user.bonus_points:
+            points_total += user.bonus_points
+            entries.append(PointsEntry(user=user, kind='bonus', points=user.bonus_points, points_total=points_total, spent_total=spent_total))
+        if user.points_spent:
+            spent_total += user.points_spent
+            entries.append(PointsEntry(user=user, kind='spent', points=user.points_spent, points_total=points_total, spent_total=spent_total))
+    PointsEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0020_unique_blitz_review_and_member'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('base', 'Chapters reviewed'), ('consecutive_chapter', 'Consecutive chapter bonus'), ('theme', 'Weekly theme bonus'), ('long_chapter', 'Long chapter bonus'), ('heat', 'Heat bonus'), ('adjustment', 'Adjustment'), ('bonus', 'Bonus points'), ('spent', 'Points spent')], max_length=19)),
+                ('points', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('points_total', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('spent_total', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('note', models.CharField(blank=True, max_length=100)),
+                ('blitz_review', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger', to='reviewblitz.blitzreview')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='reviewblitz.blitzuser')),
+            ],
+            options={
+                'verbose_name_plural': 'Points entries',
+                'indexes': [models.Index(fields=['user', 'id'], name='reviewblitz_ledger')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:24
+
+import datetime
+import decimal
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+WEEK_SECONDS = 7 * 24 * 60 * 60
+
+
+def fill_weekly_points(apps, schema_editor):
+    # A copy of the weekly points in ReviewBlitz.update_leaderboard as of this migration.
+    ReviewBlitz = apps.get_model('reviewblitz', 'ReviewBlitz')
+    BlitzReview = apps.get_model('reviewblitz', 'BlitzReview')
+    BlitzUser = apps.get_model('reviewblitz', 'BlitzUser')
+    for blitz in ReviewBlitz.objects.all():
+        def week_index(date):
+            return int((date - blitz.start_date).total_seconds() / WEEK_SECONDS) + 1
+        n_weeks = week_index(blitz.end_date - datetime.timedelta(microseconds=1))
+        weekly_points = {}
+        for member_id, posted_date, score in BlitzReview.objects.filter(blitz=blitz, approved=True).values_list('review__author', 'review__posted_date', 'score'):
+            week = week_index(posted_date)
+            if 1 <= week <= n_weeks:
+                weekly_points.setdefault(member_id, [decimal.Decimal(0)] * n_weeks)[week - 1] += score
+        users = list(BlitzUser.objects.filter(blitz=blitz))
+        for user in users:
+            user.weekly_points = weekly_points.get(user.member_id, [decimal.Decimal(0)] * n_weeks)
+        BlitzUser.objects.bulk_update(users, ['weekly_points'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0021_pointsentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blitzuser',
+            name='weekly_points',
+            field=models.JSONField(default=list, editable=False, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.RunPython(fill_weekly_points, migrations.RunPython.noop),
+    ]
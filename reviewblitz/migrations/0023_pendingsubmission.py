@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-19 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviewblitz', '0022_blitzuser_weekly_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.IntegerField()),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+                ('blitz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_submissions', to='reviewblitz.reviewblitz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('blitz', 'post_id'), name='reviewblitz_unique_pending_submission')],
+            },
+        ),
+    ]
@@ -1,9 +1,33 @@
+import copy
+import datetime
 import decimal
-from django.db.models import Sum, F, Count, Max, ExpressionWrapper, DecimalField
-from django.db.models.functions import Coalesce, Least
-from django.db import models
+import logging
+from collections import defaultdict
+from django.db.models import Sum, F, Count, Max, ExpressionWrapper, DecimalField, Exists, OuterRef, Q, Subquery, Window, prefetch_related_objects
+from django.db.models.functions import Coalesce, DenseRank, Least
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.functional import cached_property
 from forum.models import Fic, Member, Review, Chapter
+from forum.utils import get_cache_version, bump_cache_version
+from reviewblitz.scoring import score_review
+
+logger = logging.getLogger(__name__)
+
+CURRENT_BLITZ_VERSION_KEY = 'reviewblitz:current_blitz_version'
+
+WEEK_SECONDS = 7 * 24 * 60 * 60
+
+# How long a review submission can hold its claim before another
+# submission of the same review may take over, in case it never finished.
+SUBMISSION_CLAIM_TIMEOUT = datetime.timedelta(minutes=10)
+
+# The current Blitz as last loaded by this process, with the cache
+# version it was loaded at.
+_current_blitz = (None, None)
 
 
 class WeeklyTheme(models.Model):
@@ -55,6 +79,21 @@ class ReviewBlitzScoring(models.Model):
     def __str__(self):
         return self.name
 
+    def leaderboard_heat_bonus(self, chapters_given, chapters_received):
+        """
+        The heat bonus shown on the leaderboard for a reviewer who has
+        given and received the given numbers of effective chapters.
+
+        """
+        max_heat_bonus = self.max_heat_bonus_tier_0 if chapters_given < self.heat_bonus_threshold_tier_1 else self.max_heat_bonus_tier_1 if chapters_given < self.heat_bonus_threshold_tier_2 else self.max_heat_bonus
+        base_bonus = (chapters_given + 1) / (chapters_received + 1) - 1
+        if base_bonus < 0:
+            return decimal.Decimal(0)
+        if base_bonus > max_heat_bonus:
+            return max_heat_bonus
+        # Round to the nearest half-point.
+        return decimal.Decimal(int(base_bonus * 2 + 0.5)) / 2
+
 
 class ReviewBlitz(models.Model):
     title = models.CharField(max_length=255)
@@ -63,6 +102,12 @@ class ReviewBlitz(models.Model):
     reviews = models.ManyToManyField(Review, through='BlitzReview')
     scoring = models.ForeignKey(ReviewBlitzScoring, related_name='blitzes', on_delete=models.PROTECT)
     themes = models.ManyToManyField(WeeklyTheme, through='ReviewBlitzTheme')
+    # The leaderboard as it stood when the Blitz was finalized; see finalize.
+    final_standings = models.JSONField(null=True, blank=True, editable=False, encoder=DjangoJSONEncoder)
+    finalized_date = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped whenever the leaderboard is recalculated; see get_leaderboard_version.
+    leaderboard_version = models.PositiveIntegerField(default=0, editable=False)
+    leaderboard_updated = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name_plural = 'Review blitzes'
@@ -71,95 +116,287 @@ class ReviewBlitz(models.Model):
         return self.title
 
     @classmethod
-    def get_current(cls):
-        return cls.objects.latest("start_date")
+    def get_current(cls, request=None):
+        """
+        Returns the latest Blitz, with its scoring and weekly themes
+        loaded. This is kept in memory until a Blitz, theme or scoring
+        system is changed, so it usually costs one query, for the version.
+        Given the request, it's only looked up once for that request.
+
+        """
+        if request is not None:
+            if not hasattr(request, '_current_blitz'):
+                request._current_blitz = cls.get_current()
+            return request._current_blitz
+
+        global _current_blitz
+        version = get_cache_version(CURRENT_BLITZ_VERSION_KEY)
+        loaded_version, blitz = _current_blitz
+        if blitz is None or loaded_version != version:
+            blitz = cls.objects.select_related('scoring').prefetch_related('weekly_themes__theme').latest("start_date")
+            # Build the calendar now, so every copy gets it without a query
+            blitz.theme_calendar
+            _current_blitz = (version, blitz)
+        # Callers get their own copy, down to the scoring system and themes,
+        # so they can't affect each other.
+        return copy.deepcopy(blitz)
 
     def is_active(self):
         return self.start_date <= timezone.now() and self.end_date > timezone.now()
 
+    def week_index(self, date):
+        return int((date - self.start_date).total_seconds() / WEEK_SECONDS) + 1
+
     def current_week_index(self):
-        delta = timezone.now() - self.start_date
-        return int(delta.total_seconds() / (7 * 24 * 60 * 60)) + 1
+        return self.week_index(timezone.now())
+
+    @cached_property
+    def theme_calendar(self):
+        """
+        The Blitz's weekly themes as a tuple indexed by week number, with
+        None for weeks without a theme. Built once per Blitz instance,
+        from the prefetched themes if they've been loaded.
+
+        """
+        prefetch_related_objects([self], 'weekly_themes__theme')
+        weekly_themes = self.weekly_themes.all()
+        calendar = [None] * (max((theme.week for theme in weekly_themes), default=0) + 1)
+        for theme in weekly_themes:
+            calendar[theme.week] = theme.theme
+        return tuple(calendar)
+
+    def get_theme(self, week):
+        return self.theme_calendar[week] if 0 < week < len(self.theme_calendar) else None
 
     def get_current_theme(self):
-        theme = self.weekly_themes.filter(week=self.current_week_index()).first()
-        return theme.theme if theme else None
+        return self.get_theme(self.current_week_index())
+
+    def weeks(self):
+        return range(1, self.week_index(self.end_date - datetime.timedelta(microseconds=1)) + 1)
 
     def get_leaderboard(self):
-        return BlitzUser.objects.raw("""
-            SELECT
-                s.id,
-                s.username,
-                s.points,
-                s.reviews,
-                s.chapters,
-                s.words,
-                s.effective_chapters,
-                s.effective_chapters_received,
-                (CASE
-                    WHEN s.base_heat_bonus < 0 THEN 0
-                    WHEN s.base_heat_bonus > s.max_heat_bonus THEN s.max_heat_bonus
-                    ELSE ROUND(s.base_heat_bonus * 2) / 2
-                END) AS heat_bonus
-            FROM (
-                SELECT
-                    s2.*,
-                    (CASE
-                        WHEN s2.effective_chapters < %(heat_bonus_threshold_tier_1)s THEN %(max_heat_bonus_tier_0)s
-                        WHEN s2.effective_chapters < %(heat_bonus_threshold_tier_2)s THEN %(max_heat_bonus_tier_1)s
-                        ELSE %(max_heat_bonus)s
-                    END) AS max_heat_bonus,
-                    ((CAST(s2.effective_chapters AS REAL) + 1) / (CAST(s2.effective_chapters_received AS REAL) + 1)) * 1.0 - 1 AS base_heat_bonus
-                FROM (
-                    SELECT
-                        blitz_user.id,
-                        member.username,
-                        SUM(blitz_review.score) + COALESCE(blitz_user.bonus_points, 0) AS points,
-                        COUNT(blitz_review.id) AS reviews,
-                        SUM(review.chapters) AS chapters,
-                        SUM(review.word_count) AS words,
-                        COALESCE(SUM(CASE WHEN CAST(review.word_count / %(words_per_chapter)s AS INT) < review.chapters THEN CAST(review.word_count / %(words_per_chapter)s AS INT) ELSE review.chapters END), 0) AS effective_chapters,
-                        COALESCE(received_reviews.chapters_received, 0) AS effective_chapters_received
-                    FROM reviewblitz_blitzuser AS blitz_user
-                        INNER JOIN forum_member AS member
-                            ON blitz_user.member_id = member.user_id
-                        LEFT JOIN forum_review AS review
-                            ON review.author_id = member.user_id
-                        LEFT JOIN reviewblitz_blitzreview AS blitz_review
-                            ON blitz_review.review_id = review.post_id
-                            AND blitz_review.blitz_id = blitz_user.blitz_id
-                        LEFT JOIN (
-                            SELECT
-                                authors.member_id,
-                                SUM(CASE WHEN CAST(received_review.word_count / %(words_per_chapter)s AS INT) < received_review.chapters THEN CAST(received_review.word_count / %(words_per_chapter)s AS INT) ELSE received_review.chapters END) AS chapters_received
-                            FROM forum_review AS received_review
-                                INNER JOIN reviewblitz_blitzreview AS received_blitzreview
-                                    ON received_blitzreview.review_id = received_review.post_id
-                                    AND received_blitzreview.blitz_id = %(blitz_id)s
-                                    AND received_blitzreview.approved
-                                INNER JOIN forum_fic AS fic
-                                    ON received_review.fic_id = fic.id
-                                INNER JOIN forum_fic_authors AS authors
-                                    ON authors.fic_id = fic.id
-                            GROUP BY authors.member_id
-                        ) AS received_reviews
-                            ON received_reviews.member_id = member.user_id
-                    WHERE blitz_user.blitz_id = %(blitz_id)s
-                        AND blitz_review.approved
-                    GROUP BY blitz_user.id, member.user_id, received_reviews.member_id
-                    ORDER BY points DESC
-                ) s2
-            ) s
-        """, dict(
-            blitz_id=self.id,
-            words_per_chapter=self.scoring.words_per_chapter,
-            max_heat_bonus_tier_0=float(self.scoring.max_heat_bonus_tier_0),
-            heat_bonus_threshold_tier_1=self.scoring.heat_bonus_threshold_tier_1,
-            max_heat_bonus_tier_1=float(self.scoring.max_heat_bonus_tier_1),
-            heat_bonus_threshold_tier_2=self.scoring.heat_bonus_threshold_tier_2,
-            max_heat_bonus=float(self.scoring.max_heat_bonus),
-            heat_bonus_multiplier=float(self.scoring.heat_bonus_multiplier)
-        ))
+        """
+        Returns the Blitz's leaderboard entries, ranked by points. Each
+        has a rank, shared by everyone with the same points, and the
+        number of participants tied on those points, worked out in the
+        same query using window functions.
+
+        """
+        return self.blitzes.filter(reviews__gt=0).annotate(
+            username=F('member__username'),
+            rank=Window(DenseRank(), order_by=F('points').desc()),
+            tied=Window(Count('id'), partition_by=[F('points')]),
+        ).order_by('-points', 'id')
+
+    def is_finished(self):
+        return self.end_date <= timezone.now()
+
+    def get_final_standings(self):
+        """
+        Returns the frozen leaderboard if the Blitz has been finalized,
+        and the live leaderboard otherwise.
+
+        """
+        if self.final_standings is not None:
+            return self.final_standings
+        return self.get_leaderboard()
+
+    def finalize(self):
+        """
+        Recalculates the leaderboard one last time and freezes it, along
+        with every participant's totals, so the Blitz's page no longer
+        has to work it out. Finalizing again refreezes the leaderboard,
+        e.g. if reviews were corrected afterwards.
+
+        """
+        with transaction.atomic():
+            self.update_leaderboard()
+            self.final_standings = list(self.get_leaderboard().values(
+                'member', 'username', 'rank', 'tied', 'points', 'weekly_points', 'reviews', 'chapters', 'words', 'effective_chapters',
+                'effective_chapters_received', 'heat_bonus', 'bonus_points', 'points_spent'
+            ))
+            self.finalized_date = timezone.now()
+            # Not a save, which would make every process reload the current Blitz
+            ReviewBlitz.objects.filter(pk=self.pk).update(final_standings=self.final_standings, finalized_date=self.finalized_date)
+
+    def update_effective_chapters(self, reviews=None):
+        """
+        Recalculates the stored effective chapters of the given reviews
+        (or of every review in this Blitz), e.g. after a review or the
+        words per chapter have changed. Returns the number of Blitz
+        reviews that were out of date.
+
+        """
+        blitz_reviews = self.blitz_reviews.all()
+        if reviews is not None:
+            blitz_reviews = blitz_reviews.filter(review__in=reviews)
+        review = Review.objects.filter(pk=OuterRef('review'))
+        effective_chapters = Least(Subquery(review.values('chapters')), Subquery(review.values('word_count')) / self.scoring.words_per_chapter)
+        return blitz_reviews.exclude(effective_chapters=effective_chapters).update(effective_chapters=effective_chapters)
+
+    def update_leaderboard(self, members=None):
+        """
+        Recalculates the leaderboard stats of the given members (or of
+        everyone in this Blitz) from their approved reviews, entering any
+        changes to their points in their ledgers.
+
+        """
+        with transaction.atomic():
+            users = self.blitzes.all()
+            if members is not None:
+                users = users.filter(member__in=members)
+            users = list(users)
+            if not users:
+                return
+            member_ids = [user.member_id for user in users]
+
+            effective_chapters = Sum('effective_chapters')
+            approved_reviews = BlitzReview.objects.filter(blitz=self, approved=True)
+            given = {
+                stats['review__author']: stats for stats in approved_reviews.filter(review__author__in=member_ids).values('review__author').annotate(
+                    reviews=Count('id'),
+                    chapters=Sum('review__chapters'),
+                    words=Sum('review__word_count'),
+                    effective_chapters=effective_chapters
+                )
+            }
+            received = dict(approved_reviews.filter(review__fic__authors__in=member_ids).values('review__fic__authors').annotate(effective_chapters=effective_chapters).values_list('review__fic__authors', 'effective_chapters'))
+
+            # Points by week; see week_index.
+            weeks = self.weeks()
+            weekly_points = {}
+            for member_id, posted_date, score in approved_reviews.filter(review__author__in=member_ids).values_list('review__author', 'review__posted_date', 'score'):
+                week = self.week_index(posted_date)
+                if week in weeks:
+                    weekly_points.setdefault(member_id, [decimal.Decimal(0)] * len(weeks))[week - 1] += score
+
+            points = self.update_ledger(users)
+
+            for user in users:
+                stats = given.get(user.member_id, {})
+                chapters_given = stats.get('effective_chapters') or 0
+                chapters_received = received.get(user.member_id) or 0
+                BlitzUser.objects.filter(pk=user.pk).update(
+                    points=points[user.pk],
+                    weekly_points=weekly_points.get(user.member_id, [decimal.Decimal(0)] * len(weeks)),
+                    reviews=stats.get('reviews', 0),
+                    chapters=stats.get('chapters') or 0,
+                    words=stats.get('words') or 0,
+                    effective_chapters=chapters_given,
+                    effective_chapters_received=chapters_received,
+                    heat_bonus=self.scoring.leaderboard_heat_bonus(chapters_given, chapters_received)
+                )
+            ReviewBlitz.objects.filter(pk=self.pk).update(leaderboard_version=F('leaderboard_version') + 1, leaderboard_updated=timezone.now())
+
+    def get_ledger_changes(self, users, breakdown=True):
+        """
+        Works out what the given participants' points ledgers are missing:
+        points for reviews approved since, changes to approved reviews'
+        scores, reviews that are no longer approved, and changes to bonus
+        points and points spent. Returns unsaved PointsEntry instances,
+        without running totals, in the order they should be entered.
+
+        Newly approved reviews are broken down into their bonuses, unless
+        breakdown is False: then each is one adjustment, which is enough
+        to tell whose ledgers are out of date.
+
+        """
+        users = {user.member_id: user for user in users}
+        entered = {}
+        bonus_points = {}
+        points_spent = {}
+        for row in PointsEntry.objects.filter(user__in=users.values()).values('user', 'blitz_review').annotate(
+            entries=Count('id'),
+            review_points=Sum('points', filter=~Q(kind='spent'), default=0),
+            bonus_points=Sum('points', filter=Q(kind='bonus'), default=0),
+            points_spent=Sum('points', filter=Q(kind='spent'), default=0),
+        ):
+            if row['blitz_review'] is None:
+                bonus_points[row['user']] = bonus_points.get(row['user'], 0) + row['bonus_points']
+                points_spent[row['user']] = points_spent.get(row['user'], 0) + row['points_spent']
+            else:
+                entered[row['user'], row['blitz_review']] = row['entries'], row['review_points']
+
+        entries = []
+        new_reviews = set()
+        for blitz_review_id, member_id, score in self.blitz_reviews.filter(approved=True, review__author__in=users).values_list('id', 'review__author', 'score').order_by('id'):
+            user = users[member_id]
+            # Whether a review has been entered at all can't be told from its
+            # points, which may add up to nothing.
+            count, points = entered.pop((user.pk, blitz_review_id), (0, 0))
+            if not count and breakdown:
+                new_reviews.add(blitz_review_id)
+            elif not count:
+                entries.append(PointsEntry(user=user, blitz_review_id=blitz_review_id, kind='adjustment', points=score))
+            elif points != score:
+                entries.append(PointsEntry(user=user, blitz_review_id=blitz_review_id, kind='adjustment', points=score - points, note="Score changed"))
+        for (user_id, blitz_review_id), (count, points) in entered.items():
+            if points:
+                entries.append(PointsEntry(user_id=user_id, blitz_review_id=blitz_review_id, kind='adjustment', points=-points, note="No longer approved"))
+
+        if new_reviews:
+            # The bonuses depend on the reviewer's earlier reviews of the fic.
+            prev_reviews = defaultdict(list)
+            blitz_reviews = self.blitz_reviews.filter(review__author__in=users).select_related('review').prefetch_related('chapter_links__chapter').order_by('id')
+            for blitzreview in blitz_reviews.filter(review__fic__in=self.blitz_reviews.filter(id__in=new_reviews).values('review__fic')):
+                blitzreview.blitz = self
+                key = (blitzreview.review.author_id, blitzreview.review.fic_id)
+                if blitzreview.id in new_reviews:
+                    user = users[blitzreview.review.author_id]
+                    result = score_review(blitzreview, prev_reviews[key], blitzreview.theme, [link.chapter for link in blitzreview.chapter_links.all()])
+                    points_by_kind = dict(result.breakdown, adjustment=blitzreview.score - result.score)
+                    entries.extend(
+                        PointsEntry(
+                            user=user, blitz_review=blitzreview, kind=kind, points=points,
+                            note="Not matching the current scoring system" if kind == 'adjustment' else ""
+                        # The base points are always entered, to show that
+                        # the review has been, even if it scored nothing.
+                        ) for kind, points in points_by_kind.items() if points or kind == 'base'
+                    )
+                prev_reviews[key].append(blitzreview)
+
+        for user in users.values():
+            if user.bonus_points != bonus_points.get(user.pk, 0):
+                entries.append(PointsEntry(user=user, kind='bonus', points=user.bonus_points - bonus_points.get(user.pk, 0)))
+            if user.points_spent != points_spent.get(user.pk, 0):
+                entries.append(PointsEntry(user=user, kind='spent', points=user.points_spent - points_spent.get(user.pk, 0)))
+        return entries
+
+    def update_ledger(self, users):
+        """
+        Enters any changes to the given participants' points in their
+        ledgers, and returns a dict of their points totals by ID.
+
+        """
+        latest = PointsEntry.objects.filter(user=OuterRef('pk')).order_by('-id')
+        entries = self.get_ledger_changes(users, breakdown=False)
+        if entries:
+            # Lock the participants whose ledgers are changing and check
+            # again, in case another update has entered the changes since.
+            changed = list(BlitzUser.objects.select_for_update().filter(pk__in={entry.user_id for entry in entries}).order_by('pk').annotate(
+                points_total=Coalesce(Subquery(latest.values('points_total')[:1]), decimal.Decimal(0)),
+                spent_total=Coalesce(Subquery(latest.values('spent_total')[:1]), decimal.Decimal(0)),
+            ))
+            totals = {user.pk: [user.points_total, user.spent_total] for user in changed}
+            entries = self.get_ledger_changes(changed)
+            for entry in entries:
+                running = totals[entry.user_id]
+                running[entry.kind == 'spent'] += entry.points
+                entry.points_total, entry.spent_total = running
+            PointsEntry.objects.bulk_create(entries)
+
+        return dict(BlitzUser.objects.filter(pk__in=[user.pk for user in users]).annotate(
+            points_total=Coalesce(Subquery(latest.values('points_total')[:1]), decimal.Decimal(0))
+        ).values_list('pk', 'points_total'))
+
+    def get_leaderboard_version(self):
+        """
+        Returns the leaderboard's current version and when it was last
+        updated, read from the database, since this Blitz may be a copy
+        of the current Blitz kept in memory.
+
+        """
+        return ReviewBlitz.objects.filter(pk=self.pk).values_list('leaderboard_version', 'leaderboard_updated').get()
 
 
 class ReviewBlitzTheme(models.Model):
@@ -177,23 +414,37 @@ class ReviewBlitzTheme(models.Model):
 class BlitzReview(models.Model):
     class Meta:
         permissions = (("approve", "Can approve or reject reviews"),)
+        constraints = [models.UniqueConstraint(fields=['blitz', 'review'], name='reviewblitz_unique_blitz_review')]
     blitz = models.ForeignKey(ReviewBlitz, related_name='blitz_reviews', on_delete=models.CASCADE)
     review = models.ForeignKey(Review, related_name='blitz_reviews', on_delete=models.CASCADE)
     theme = models.BooleanField(default=False)
     score = models.DecimalField(max_digits=4, decimal_places=2)
     approved = models.BooleanField(default=False)
     heat_bonus = models.DecimalField(max_digits=2, decimal_places=1, default=0)
+    # Stored so the leaderboard can add these up; see effective_chapters_reviewed.
+    effective_chapters = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return str(self.review)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that saving a review that is still pending can
+        # leave the leaderboard alone; see update_leaderboard_for_review.
+        instance._approved_in_db = instance.__dict__.get('approved', False)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.effective_chapters = self.effective_chapters_reviewed()
+        super().save(*args, **kwargs)
+        self._approved_in_db = self.approved
+
     def week_index(self):
-        delta = self.review.posted_date - self.blitz.start_date
-        return int(delta.total_seconds() / (7 * 24 * 60 * 60)) + 1
+        return self.blitz.week_index(self.review.posted_date)
 
     def get_theme(self):
-        theme = self.blitz.weekly_themes.filter(week=self.week_index()).first()
-        return theme.theme if theme else None
+        return self.blitz.get_theme(self.week_index())
 
     def effective_chapters_reviewed(self):
         return min(self.review.word_count // self.blitz.scoring.words_per_chapter, self.review.chapters)
@@ -203,48 +454,41 @@ class BlitzReview(models.Model):
 
         scoring = self.blitz.scoring
         # If hypothetically a fic has multiple authors, we should get the biggest heat bonus that applies for any of them.
-        for author in self.review.fic.get_authors():
-            print("Calculating heat bonus for author %s..." % author.username)
-            try:
-                recipient = BlitzUser.objects.get(blitz=self.blitz, member=author)
-            except BlitzUser.DoesNotExist:
-                # This author is not participating in Blitz - no heat bonus.
-                print("Author not participating in Blitz!")
-                continue
-
-            # Have we already claimed a heat bonus for this author this Blitz?
-            prev_heat_bonus = BlitzReview.objects.filter(blitz=self.blitz, review__author=self.review.author, review__fic__authors=author, heat_bonus__gt=0).exists()
-
-            print("Previous heat bonus claimed:", prev_heat_bonus)
-
-            if prev_heat_bonus:
+        # The reviews each author has given and received are read off their leaderboard stats, and whether we've already
+        # claimed a heat bonus for them this Blitz comes along in the same query. Authors who aren't participating in
+        # the Blitz have no BlitzUser and so get no heat bonus.
+        recipients = BlitzUser.objects.filter(blitz=self.blitz, member__fics=self.review.fic_id).annotate(
+            prev_heat_bonus=Exists(BlitzReview.objects.filter(blitz=self.blitz, review__author=self.review.author_id, review__fic__authors=OuterRef('member'), heat_bonus__gt=0))
+        )
+        for recipient in recipients:
+            if recipient.prev_heat_bonus:
                 # We've already received a heat bonus for this author this Blitz - no double-dipping.
+                logger.debug("Heat bonus for review %s, author %s: already claimed", self.review.pk, recipient.member_id)
                 continue
 
-            reviews_given = int(BlitzReview.objects.filter(blitz=self.blitz, review__author=author, approved=True).aggregate(effective_chapters=Sum(Least(F('review__chapters'), F('review__word_count') / scoring.words_per_chapter)))['effective_chapters'] or 0)
-            print("Chapter reviews given:", reviews_given)
-            reviews_received = int(BlitzReview.objects.filter(blitz=self.blitz, review__fic__authors=author, approved=True).aggregate(effective_chapters=Sum(Least(F('review__chapters'), F('review__word_count') / scoring.words_per_chapter)))['effective_chapters'] or 0)
-            print("Chapter reviews received:", reviews_received)
+            reviews_given = recipient.effective_chapters
+            reviews_received = recipient.effective_chapters_received
 
             if reviews_given <= reviews_received:
                 # No bonus for an author who has received the same number or more reviews than they've given.
+                logger.debug("Heat bonus for review %s, author %s: given=%s received=%s, no bonus", self.review.pk, recipient.member_id, reviews_given, reviews_received)
                 continue
 
             max_heat_bonus = scoring.max_heat_bonus_tier_0 if reviews_given < scoring.heat_bonus_threshold_tier_1 else scoring.max_heat_bonus_tier_1 if reviews_given < scoring.heat_bonus_threshold_tier_2 else scoring.max_heat_bonus
-            print("Max heat bonus:", max_heat_bonus)
-
             base_bonus = min((reviews_given + 1) / (reviews_received + 1) * float(scoring.heat_bonus_multiplier) - 1, float(max_heat_bonus))
-            print("Base bonus:", base_bonus)
 
             # Round to the nearest half-point.
             rounded_bonus = int(base_bonus * 2 + 0.5) / 2
-            print("Rounded bonus:", rounded_bonus)
+            logger.debug(
+                "Heat bonus for review %s, author %s: given=%s received=%s max=%s base=%s rounded=%s",
+                self.review.pk, recipient.member_id, reviews_given, reviews_received, max_heat_bonus, base_bonus, rounded_bonus
+            )
 
             # If this is bigger than the heat bonus we currently have, replace it.
             if rounded_bonus > heat_bonus:
                 heat_bonus = rounded_bonus
 
-        print("Final heat bonus:", heat_bonus)
+        logger.debug("Heat bonus for review %s: %s", self.review.pk, heat_bonus)
         return decimal.Decimal(heat_bonus)
 
 
@@ -265,5 +509,153 @@ class BlitzUser(models.Model):
     bonus_points = models.DecimalField(max_digits=4, decimal_places=2, default=0)
     points_spent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
+    # Leaderboard stats, kept up to date by ReviewBlitz.update_leaderboard.
+    points = models.DecimalField(max_digits=7, decimal_places=2, default=0, editable=False)
+    reviews = models.PositiveIntegerField(default=0, editable=False)
+    chapters = models.PositiveIntegerField(default=0, editable=False)
+    words = models.PositiveIntegerField(default=0, editable=False)
+    effective_chapters = models.PositiveIntegerField(default=0, editable=False)
+    effective_chapters_received = models.PositiveIntegerField(default=0, editable=False)
+    heat_bonus = models.DecimalField(max_digits=3, decimal_places=1, default=0, editable=False)
+    # The points from each week of the Blitz, in order.
+    weekly_points = models.JSONField(default=list, encoder=DjangoJSONEncoder, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['blitz', '-points', 'id'], name='reviewblitz_leaderboard')]
+        constraints = [models.UniqueConstraint(fields=['blitz', 'member'], name='reviewblitz_unique_blitz_member')]
+
     def __str__(self):
         return "{}'s stats for {}".format(self.member, self.blitz)
+
+
+class PointsEntry(models.Model):
+    """
+    An entry in a Blitz participant's points ledger. Entries are only
+    ever added, by ReviewBlitz.update_ledger: each records a change to
+    the participant's points, or to their points spent, along with both
+    running totals after it.
+
+    """
+    KINDS = (
+        ('base', "Chapters reviewed"),
+        ('consecutive_chapter', "Consecutive chapter bonus"),
+        ('theme', "Weekly theme bonus"),
+        ('long_chapter', "Long chapter bonus"),
+        ('heat', "Heat bonus"),
+        ('adjustment', "Adjustment"),
+        ('bonus', "Bonus points"),
+        ('spent', "Points spent"),
+    )
+    user = models.ForeignKey(BlitzUser, related_name='ledger', on_delete=models.CASCADE)
+    # Kept when the review is deleted, so its entries can still be traced.
+    blitz_review = models.ForeignKey(BlitzReview, related_name='ledger', null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False)
+    kind = models.CharField(max_length=19, choices=KINDS)
+    points = models.DecimalField(max_digits=7, decimal_places=2)
+    points_total = models.DecimalField(max_digits=7, decimal_places=2)
+    spent_total = models.DecimalField(max_digits=7, decimal_places=2)
+    date = models.DateTimeField(auto_now_add=True)
+    note = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Points entries'
+        indexes = [models.Index(fields=['user', 'id'], name='reviewblitz_ledger')]
+
+    def __str__(self):
+        return "{}: {} {}".format(self.user, self.points, self.get_kind_display())
+
+
+class PendingSubmission(models.Model):
+    """
+    A claim on a review that's being submitted to a Blitz, held from
+    before the review is fetched until it has been scored. While it
+    exists, submitting the same review again (a double-click, another
+    tab) does nothing, rather than fetching and scoring it twice.
+
+    """
+    blitz = models.ForeignKey(ReviewBlitz, related_name='pending_submissions', on_delete=models.CASCADE)
+    post_id = models.IntegerField()
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['blitz', 'post_id'], name='reviewblitz_unique_pending_submission')]
+
+    def __str__(self):
+        return "Submission of post {} to {}".format(self.post_id, self.blitz)
+
+    @classmethod
+    def claim(cls, blitz, post_id):
+        """
+        Claims the review with the given post ID for submission to the
+        Blitz, returning the claim, or None if it's already claimed. The
+        claim is committed straight away, so other requests see it.
+
+        """
+        cls.objects.filter(blitz=blitz, post_id=post_id, claimed_at__lt=timezone.now() - SUBMISSION_CLAIM_TIMEOUT).delete()
+        try:
+            with transaction.atomic():
+                return cls.objects.create(blitz=blitz, post_id=post_id)
+        except IntegrityError:
+            return None
+
+
+@receiver(post_save, sender=ReviewBlitz)
+@receiver(post_delete, sender=ReviewBlitz)
+@receiver(post_save, sender=ReviewBlitzTheme)
+@receiver(post_delete, sender=ReviewBlitzTheme)
+@receiver(post_save, sender=ReviewBlitzScoring)
+@receiver(post_delete, sender=ReviewBlitzScoring)
+@receiver(post_save, sender=WeeklyTheme)
+@receiver(post_delete, sender=WeeklyTheme)
+def reload_current_blitz(sender, **kwargs):
+    bump_cache_version(CURRENT_BLITZ_VERSION_KEY)
+
+
+@receiver(post_save, sender=ReviewBlitz)
+def update_leaderboard_for_blitz(sender, instance, created, **kwargs):
+    if not created:
+        # The dates, and so the weekly points, may have changed
+        instance.update_leaderboard()
+
+
+@receiver(post_save, sender=BlitzReview)
+@receiver(post_delete, sender=BlitzReview)
+def update_leaderboard_for_review(sender, instance, **kwargs):
+    if not instance.approved and not (kwargs['signal'] is post_save and getattr(instance, '_approved_in_db', False)):
+        # Pending reviews don't count towards the leaderboard, unless
+        # this one was approved until now (e.g. it was resubmitted)
+        return
+    try:
+        blitz = instance.blitz
+    except ReviewBlitz.DoesNotExist:
+        # The whole Blitz is being deleted
+        return
+    try:
+        # The reviewer's stats and the reviewed authors' received chapters
+        members = [instance.review.author_id, *instance.review.fic.authors.values_list('pk', flat=True)]
+    except Review.DoesNotExist:
+        # The review is being deleted; we can't tell who it affected
+        members = None
+    blitz.update_leaderboard(members)
+
+
+@receiver(post_save, sender=BlitzUser)
+def update_leaderboard_for_user(sender, instance, **kwargs):
+    instance.blitz.update_leaderboard([instance.member_id])
+
+
+@receiver(post_save, sender=Review)
+def update_leaderboard_for_changed_review(sender, instance, created, **kwargs):
+    if not created:
+        for blitzreview in instance.blitz_reviews.select_related('blitz__scoring'):
+            blitzreview.blitz.update_effective_chapters([instance])
+            if blitzreview.approved:
+                blitzreview.blitz.update_leaderboard([instance.author_id, *instance.fic.authors.values_list('pk', flat=True)])
+
+
+@receiver(post_save, sender=ReviewBlitzScoring)
+def update_leaderboards_for_scoring(sender, instance, created, **kwargs):
+    if not created:
+        for blitz in instance.blitzes.all():
+            # The words per chapter may have changed
+            blitz.update_effective_chapters()
+            blitz.update_leaderboard()
@@ -0,0 +1,95 @@
+"""
+Scoring of Review Blitz reviews.
+
+score_review works out what a review is worth from the reviews the same
+reviewer already submitted of the same fic during the Blitz, without
+touching the database as long as the Blitz's scoring system and weekly
+themes are loaded, broken down into the kinds of points entered in the
+participants' ledgers (see PointsEntry). rescore_blitz runs it over a whole Blitz in the order
+the reviews were submitted, so scores can be recalculated after the
+scoring system has been changed.
+
+"""
+import logging
+from collections import defaultdict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+ReviewScore = namedtuple('ReviewScore', ['score', 'theme_bonuses', 'long_chapters', 'breakdown'])
+
+
+def score_review(blitzreview, prev_reviews, satisfies_theme, chapters):
+    """
+    Scores a Blitz review, given the earlier Blitz reviews of the same
+    fic by the same reviewer, whether the reviewer says it satisfies the
+    weekly theme and the chapters it covers. The heat bonus is not
+    calculated here: the review's stored heat bonus is added as it is.
+
+    """
+    scoring = blitzreview.blitz.scoring
+    weekly_theme = blitzreview.get_theme()
+
+    # Find how many effective chapters (i.e. number of chapters or increments of the Blitz's
+    # words per chapter, whichever is smaller) we've already reviewed of this fic this Blitz.
+    prev_chapters_reviewed = sum(r.effective_chapters_reviewed() for r in prev_reviews)
+    effective_chapters_reviewed = blitzreview.effective_chapters_reviewed()
+    logger.debug("Review %s: week=%s effective_chapters=%s previous=%s", blitzreview.review_id, blitzreview.week_index(), effective_chapters_reviewed, prev_chapters_reviewed)
+
+    # The base score is the number of effective chapters reviewed times the base chapter points.
+    breakdown = {'base': effective_chapters_reviewed * scoring.chapter_points}
+
+    # Check how many consecutive chapter intervals we tick over with this review and apply the consecutive chapter bonus.
+    if not weekly_theme or weekly_theme.consecutive_chapter_bonus_applies:
+        chapter_bonuses = (effective_chapters_reviewed + prev_chapters_reviewed) // scoring.consecutive_chapter_interval - prev_chapters_reviewed // scoring.consecutive_chapter_interval
+        logger.debug("Review %s: %s consecutive chapter bonuses", blitzreview.review_id, chapter_bonuses)
+        breakdown['consecutive_chapter'] = chapter_bonuses * scoring.consecutive_chapter_bonus
+
+    # Apply theme bonuses.
+    theme_bonuses = 0
+    if weekly_theme:
+        theme_bonuses = weekly_theme.claimable_theme_bonuses(satisfies_theme, blitzreview, prev_reviews)
+        if theme_bonuses:
+            logger.debug("Review %s: claiming weekly theme %sx", blitzreview.review_id, theme_bonuses)
+            breakdown['theme'] = scoring.theme_bonus * theme_bonuses
+
+    # Apply long chapter bonuses.
+    long_chapters = set()
+    breakdown['long_chapter'] = 0
+    for chapter in chapters:
+        if chapter.word_count >= scoring.long_chapter_bonus_words:
+            breakdown['long_chapter'] += scoring.long_chapter_bonus
+            long_chapters.add(chapter)
+
+    # Apply the heat bonus.
+    if scoring.heat_bonus_multiplier:
+        breakdown['heat'] = blitzreview.heat_bonus
+
+    score = sum(breakdown.values())
+    logger.debug("Review %s: score %s", blitzreview.review_id, score)
+    return ReviewScore(score, theme_bonuses, long_chapters, breakdown)
+
+
+def rescore_blitz(blitz):
+    """
+    Recalculates the score of every review in the given Blitz in one
+    pass, in the order they were submitted. The reviews are updated in
+    place but not saved; returns a list of (review, old score, old theme
+    flag) tuples.
+
+    A review's theme flag stands in for the theme checkbox it was
+    submitted with, and its linked long chapters for the chapters it
+    covers. Heat bonuses are kept as they were awarded.
+
+    """
+    results = []
+    prev_reviews = defaultdict(list)
+    blitz_reviews = blitz.blitz_reviews.select_related('review__author', 'review__fic').prefetch_related('chapter_links__chapter').order_by('id')
+    for blitzreview in blitz_reviews:
+        old_score, old_theme = blitzreview.score, blitzreview.theme
+        key = (blitzreview.review.author_id, blitzreview.review.fic_id)
+        result = score_review(blitzreview, prev_reviews[key], old_theme, [link.chapter for link in blitzreview.chapter_links.all()])
+        blitzreview.score = result.score
+        blitzreview.theme = old_theme and result.theme_bonuses > 0
+        prev_reviews[key].append(blitzreview)
+        results.append((blitzreview, old_score, old_theme))
+    return results
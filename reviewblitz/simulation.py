@@ -0,0 +1,258 @@
+"""
+What-if simulation of Review Blitz scoring systems.
+
+BlitzSimulation loads a past Blitz's reviews into NumPy arrays once, and
+can then work out the final leaderboard under any number of candidate
+scoring systems at once: every quantity that depends on the scoring
+system is an array with one row per candidate.
+
+The rules are those of reviewblitz.scoring, with two approximations,
+since the Blitz's history isn't fully recorded: each review's theme flag
+stands in for the theme checkbox it was submitted with, and heat bonuses
+are replayed in submission order as if every review that ended up
+approved had been approved as soon as it was submitted.
+
+"""
+import itertools
+from collections import defaultdict
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+from forum.models import Fic
+from reviewblitz.models import ReviewBlitzScoring
+
+# The scoring parameters that can be varied. Minimum words and the long
+# chapter threshold can't be, since reviews and chapters outside them
+# were never recorded.
+SIMULATED_FIELDS = (
+    'words_per_chapter', 'chapter_points', 'consecutive_chapter_interval', 'consecutive_chapter_bonus',
+    'theme_bonus', 'long_chapter_bonus', 'heat_bonus_multiplier', 'max_heat_bonus_tier_0',
+    'heat_bonus_threshold_tier_1', 'max_heat_bonus_tier_1', 'heat_bonus_threshold_tier_2', 'max_heat_bonus',
+)
+# Parameters that are divided by, and so can't be zero.
+DIVISOR_FIELDS = ('words_per_chapter', 'consecutive_chapter_interval')
+
+# Weekly theme kinds, as far as scoring is concerned.
+THEME_FIXED, THEME_PER_CHAPTER, THEME_SUBSEQUENT_CHAPTERS = range(3)
+
+
+def parse_values(field_name, text):
+    """
+    Parses a comma-separated list of values for the given scoring field,
+    raising ValidationError if any of them is invalid.
+
+    """
+    field = ReviewBlitzScoring._meta.get_field(field_name)
+    values = []
+    for value in text.split(','):
+        if value.strip():
+            value = field.to_python(value.strip())
+            if value < 0 or (value == 0 and field_name in DIVISOR_FIELDS):
+                raise ValidationError("%s must be greater than zero." % field.verbose_name.capitalize())
+            values.append(value)
+    return values
+
+
+def build_grid(scoring, values):
+    """
+    Returns a list of candidate scoring systems, as dicts of the
+    simulated fields: the given scoring system first, followed by every
+    combination of the given values (a dict of field name to list of
+    values), with the given scoring system's value for the rest.
+
+    """
+    current = {field: getattr(scoring, field) for field in SIMULATED_FIELDS}
+    varied = [field for field in SIMULATED_FIELDS if values.get(field)]
+    return [current] + [
+        dict(current, **dict(zip(varied, combination)))
+        for combination in itertools.product(*(values[field] for field in varied))
+    ]
+
+
+class BlitzSimulation(object):
+    def __init__(self, blitz):
+        self.blitz = blitz
+        blitz_reviews = list(blitz.blitz_reviews.select_related('review').prefetch_related('chapter_links__chapter').order_by('id'))
+
+        # The leaderboard is made up of the Blitz's participants, in the
+        # order they'd be listed in when tied.
+        users = list(blitz.blitzes.select_related('member').order_by('id'))
+        self.members = [user.member for user in users]
+        member_index = {user.member_id: i for i, user in enumerate(users)}
+        self.bonus_points = np.array([float(user.bonus_points) for user in users])
+
+        fic_authors = defaultdict(list)
+        for fic_id, member_id in Fic.authors.through.objects.filter(fic__reviews__blitz_reviews__blitz=blitz).values_list('fic_id', 'member_id').distinct():
+            if member_id in member_index:
+                fic_authors[fic_id].append(member_index[member_id])
+
+        long_chapter_bonus_words = blitz.scoring.long_chapter_bonus_words
+        self.reviewer = np.array([member_index.get(br.review.author_id, -1) for br in blitz_reviews], dtype=int)
+        self.chapters = np.array([br.review.chapters for br in blitz_reviews], dtype=int)
+        self.words = np.array([br.review.word_count for br in blitz_reviews], dtype=int)
+        self.approved = np.array([br.approved and member_index.get(br.review.author_id) is not None for br in blitz_reviews], dtype=bool)
+        self.long_chapters = np.array([sum(1 for link in br.chapter_links.all() if link.chapter.word_count >= long_chapter_bonus_words) for br in blitz_reviews], dtype=int)
+        self.authors = [fic_authors[br.review.fic_id] for br in blitz_reviews]
+
+        # How each review's weekly theme bonus works out: a number of
+        # bonuses that doesn't depend on the scoring system, or one that
+        # depends on the number of chapters reviewed.
+        self.theme_box = np.array([br.theme for br in blitz_reviews], dtype=int)
+        self.theme_kind = np.full(len(blitz_reviews), THEME_FIXED)
+        self.theme_bonuses = np.zeros(len(blitz_reviews), dtype=int)
+        self.consecutive_chapter_bonus_applies = np.ones(len(blitz_reviews), dtype=bool)
+        # Each review's group of reviews of the same fic by the same reviewer.
+        groups = {}
+        group = []
+        prev_reviews = defaultdict(list)
+        for i, br in enumerate(blitz_reviews):
+            key = (br.review.author_id, br.review.fic_id)
+            group.append(groups.setdefault(key, len(groups)))
+            weekly_theme = br.get_theme()
+            if weekly_theme:
+                self.consecutive_chapter_bonus_applies[i] = weekly_theme.consecutive_chapter_bonus_applies
+                if weekly_theme.claimable == 'per_chapter':
+                    self.theme_kind[i] = THEME_SUBSEQUENT_CHAPTERS if weekly_theme.subsequent_chapter_theme_bonus else THEME_PER_CHAPTER
+                elif weekly_theme.claimable in ('per_review', 'per_fic'):
+                    self.theme_bonuses[i] = weekly_theme.claimable_theme_bonuses(br.theme, br, prev_reviews[key])
+            prev_reviews[key].append(br)
+
+        # Cumulative sums within each group are taken over the reviews
+        # sorted by group (stably, so still in submission order).
+        group = np.array(group, dtype=int)
+        self.group_order = np.argsort(group, kind='stable')
+        self.group_sizes = np.bincount(group, minlength=len(groups))
+        self.group_starts = np.concatenate(([0], np.cumsum(self.group_sizes)[:-1])).astype(int)
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def effective_chapters(self, params):
+        return np.minimum(self.chapters, self.words // params['words_per_chapter'][:, None])
+
+    def prev_effective_chapters(self, effective_chapters):
+        """
+        The effective chapters reviewed of the same fic by the same
+        reviewer before each review.
+
+        """
+        grouped = effective_chapters[:, self.group_order]
+        prev = np.cumsum(grouped, axis=1) - grouped
+        prev -= np.repeat(prev[:, self.group_starts], self.group_sizes, axis=1)
+        result = np.empty_like(prev)
+        result[:, self.group_order] = prev
+        return result
+
+    def heat_bonuses(self, params, effective_chapters):
+        """
+        Replays the heat bonus calculation for every review in submission
+        order.
+
+        """
+        n_configs = effective_chapters.shape[0]
+        given = np.zeros((n_configs, len(self.members)))
+        received = np.zeros((n_configs, len(self.members)))
+        claimed = defaultdict(lambda: np.zeros(n_configs, dtype=bool))
+        multiplier = params['heat_bonus_multiplier']
+        heat_bonuses = np.zeros(effective_chapters.shape)
+        for i in range(len(self)):
+            reviewer = self.reviewer[i]
+            heat_bonus = np.zeros(n_configs)
+            for author in self.authors[i]:
+                reviews_given, reviews_received = given[:, author], received[:, author]
+                max_heat_bonus = np.where(
+                    reviews_given < params['heat_bonus_threshold_tier_1'], params['max_heat_bonus_tier_0'],
+                    np.where(reviews_given < params['heat_bonus_threshold_tier_2'], params['max_heat_bonus_tier_1'], params['max_heat_bonus'])
+                )
+                base_bonus = np.minimum((reviews_given + 1) / (reviews_received + 1) * multiplier - 1, max_heat_bonus)
+                rounded_bonus = np.trunc(base_bonus * 2 + 0.5) / 2
+                eligible = (reviews_given > reviews_received) & ~claimed[reviewer, author]
+                heat_bonus = np.maximum(heat_bonus, np.where(eligible, rounded_bonus, 0))
+            heat_bonuses[:, i] = np.where(multiplier != 0, heat_bonus, 0)
+
+            for author in self.authors[i]:
+                claimed[reviewer, author] |= heat_bonuses[:, i] > 0
+            if self.approved[i]:
+                given[:, reviewer] += effective_chapters[:, i]
+                received[:, self.authors[i]] += effective_chapters[:, i][:, None]
+        return heat_bonuses
+
+    def scores(self, params):
+        """
+        Returns the score of every review under every candidate scoring
+        system, as a (candidates, reviews) array.
+
+        """
+        effective_chapters = self.effective_chapters(params)
+        prev_chapters_reviewed = self.prev_effective_chapters(effective_chapters)
+        interval = params['consecutive_chapter_interval'][:, None]
+        chapter_bonuses = np.where(
+            self.consecutive_chapter_bonus_applies,
+            (effective_chapters + prev_chapters_reviewed) // interval - prev_chapters_reviewed // interval,
+            0
+        )
+        theme_bonuses = np.where(
+            self.theme_kind == THEME_PER_CHAPTER, effective_chapters * self.theme_box,
+            np.where(self.theme_kind == THEME_SUBSEQUENT_CHAPTERS, self.theme_box + effective_chapters - 1, self.theme_bonuses)
+        )
+        return (
+            effective_chapters * params['chapter_points'][:, None]
+            + chapter_bonuses * params['consecutive_chapter_bonus'][:, None]
+            + theme_bonuses * params['theme_bonus'][:, None]
+            + self.long_chapters * params['long_chapter_bonus'][:, None]
+            + self.heat_bonuses(params, effective_chapters)
+        )
+
+    def points(self, configs, chunk_size=1024):
+        """
+        Returns every participant's final points under each of the given
+        scoring systems, as a (candidates, participants) array.
+
+        """
+        # Sums each participant's approved review scores.
+        approved = np.flatnonzero(self.approved)
+        review_members = np.zeros((len(approved), len(self.members)))
+        review_members[np.arange(len(approved)), self.reviewer[approved]] = 1
+
+        results = []
+        for start in range(0, len(configs), chunk_size):
+            chunk = configs[start:start + chunk_size]
+            params = {field: np.array([float(config[field]) for config in chunk]) for field in SIMULATED_FIELDS}
+            params['words_per_chapter'] = params['words_per_chapter'].astype(int)
+            params['consecutive_chapter_interval'] = params['consecutive_chapter_interval'].astype(int)
+            results.append(self.scores(params)[:, approved] @ review_members + self.bonus_points)
+        return np.round(np.concatenate(results), 2) if results else np.zeros((0, len(self.members)))
+
+    def simulate(self, configs):
+        """
+        Works out the leaderboard under each of the given scoring
+        systems, and compares it to the leaderboard under the first one.
+        Returns a list of dicts describing each scoring system's results.
+
+        """
+        points = self.points(configs)
+        # Only participants with approved reviews make the leaderboard.
+        on_leaderboard = np.bincount(self.reviewer[self.approved], minlength=len(self.members)) > 0
+        members = [member for member, included in zip(self.members, on_leaderboard) if included]
+        points = points[:, on_leaderboard]
+        if not members:
+            return []
+
+        # Sorting stably keeps ties in leaderboard order.
+        order = np.argsort(-points, axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(len(members)), axis=1)
+        rank_changes = np.abs(ranks - ranks[0])
+
+        return [{
+            'config': config,
+            'leaders': [members[i] for i in order[k, :3]],
+            'rank_changes': int(np.count_nonzero(rank_changes[k])),
+            'max_rank_change': int(rank_changes[k].max()),
+            'min': float(points[k].min()),
+            'median': float(np.median(points[k])),
+            'mean': float(points[k].mean()),
+            'max': float(points[k].max()),
+            'std': float(points[k].std()),
+        } for k, config in enumerate(configs)]
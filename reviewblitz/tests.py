@@ -1,3 +1,261 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from bs4 import BeautifulSoup
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from forum.models import Chapter, Fic, Member, Review
+from reviewblitz.models import BlitzReview, BlitzUser, PendingSubmission, PointsEntry, ReviewBlitz, ReviewBlitzScoring, ReviewChapterLink
+from reviewblitz.scoring import rescore_blitz, score_review
+from reviewblitz.views import HasReviewedView
+
+
+class BlitzTestCase(TestCase):
+    def setUp(self):
+        scoring = ReviewBlitzScoring.objects.create(
+            name="Test", min_words=250, words_per_chapter=500, chapter_points=1,
+            consecutive_chapter_interval=5, consecutive_chapter_bonus=1, theme_bonus=Decimal('0.5'),
+            long_chapter_bonus_words=5000, long_chapter_bonus=Decimal('0.5'), heat_bonus_multiplier=1,
+            max_heat_bonus_tier_0=Decimal('0.5'), heat_bonus_threshold_tier_1=5, max_heat_bonus_tier_1=1,
+            heat_bonus_threshold_tier_2=20, max_heat_bonus=2
+        )
+        now = timezone.now()
+        self.blitz = ReviewBlitz.objects.create(title="Test Blitz", start_date=now - timedelta(days=10), end_date=now + timedelta(days=20), scoring=scoring)
+        self.author = Member.objects.create(user_id=1, username="Author")
+        self.reviewer = Member.objects.create(user_id=2, username="Reviewer")
+        self.fic = Fic.objects.create(title="Fic", thread_id=1, posted_date=self.blitz.start_date)
+        self.fic.authors.add(self.author)
+        self.long_chapter = Chapter.objects.create(post_id=1, fic=self.fic, word_count=6000, posted_date=self.blitz.start_date)
+        self.user = BlitzUser.objects.create(blitz=self.blitz, member=self.reviewer)
+
+    def submit(self, post_id, chapters, word_count, long_chapters=()):
+        review = Review.objects.create(
+            post_id=post_id, author=self.reviewer, fic=self.fic, chapters=chapters, word_count=word_count,
+            posted_date=self.blitz.start_date + timedelta(days=1)
+        )
+        blitzreview = BlitzReview(blitz=self.blitz, review=review)
+        prev_reviews = list(self.blitz.blitz_reviews.filter(review__author=self.reviewer, review__fic=self.fic))
+        blitzreview.score = score_review(blitzreview, prev_reviews, False, long_chapters).score
+        blitzreview.save()
+        for chapter in long_chapters:
+            ReviewChapterLink.objects.create(review=blitzreview, chapter=chapter)
+        return blitzreview
+
+
+class ScoringTests(BlitzTestCase):
+    def test_breakdown(self):
+        first = self.submit(100, 4, 2000, [self.long_chapter])
+        result = score_review(first, [], False, [self.long_chapter])
+        self.assertEqual(result.breakdown, {'base': 4, 'consecutive_chapter': 0, 'long_chapter': Decimal('0.5'), 'heat': 0})
+        self.assertEqual(result.score, Decimal('4.5'))
+        self.assertEqual(result.long_chapters, {self.long_chapter})
+
+        # The fifth chapter of the fic ticks over a consecutive chapter bonus
+        second = self.submit(101, 3, 1500)
+        result = score_review(second, [first], False, [])
+        self.assertEqual(result.breakdown, {'base': 3, 'consecutive_chapter': 1, 'long_chapter': 0, 'heat': 0})
+        self.assertEqual(result.score, 4)
+
+    def test_rescore_blitz(self):
+        first = self.submit(100, 4, 2000, [self.long_chapter])
+        second = self.submit(101, 3, 1500)
+        ReviewBlitzScoring.objects.filter(pk=self.blitz.scoring_id).update(chapter_points=2)
+        results = rescore_blitz(ReviewBlitz.objects.get(pk=self.blitz.pk))
+        self.assertEqual(
+            [(blitzreview.pk, blitzreview.score, old_score) for blitzreview, old_score, old_theme in results],
+            [(first.pk, Decimal('8.5'), Decimal('4.5')), (second.pk, 7, 4)]
+        )
+
+
+class CurrentBlitzTests(BlitzTestCase):
+    def test_copies_not_shared(self):
+        first = ReviewBlitz.get_current()
+        second = ReviewBlitz.get_current()
+        self.assertEqual(first, second)
+        self.assertIsNot(first.scoring, second.scoring)
+
+    def test_looked_up_once_per_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blitz_leaderboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([query for query in queries if '"forum_cacheversion"' in query['sql']]), 1)
+
+
+class SubmissionTests(BlitzTestCase):
+    @mock.patch('reviewblitz.views.score_review', wraps=score_review)
+    @mock.patch('reviewblitz.forms.ReviewPage')
+    def test_duplicate_submission(self, review_page, scorer):
+        review = Review.objects.create(
+            post_id=100, author=self.reviewer, fic=self.fic, chapters=1, word_count=2000,
+            posted_date=self.blitz.start_date + timedelta(days=1)
+        )
+        self.client.force_login(get_user_model().objects.create(username="reviewer", member=self.reviewer, verified=True))
+        data = {'review': "https://f/posts/100/", 'chapters': 2, 'chapter_links-TOTAL_FORMS': 0, 'chapter_links-INITIAL_FORMS': 0}
+        duplicates = []
+
+        def fetch_review(url):
+            # Submit the review again while the first submission is fetching it
+            if review_page.from_url.call_count == 1:
+                duplicates.append(self.client.post(reverse('blitz_review_submit'), data))
+            return SimpleNamespace(object=review)
+        review_page.from_url.side_effect = fetch_review
+
+        response = self.client.post(reverse('blitz_review_submit'), data)
+        self.assertRedirects(response, reverse('blitz_user'), fetch_redirect_response=False)
+        self.assertRedirects(duplicates[0], reverse('blitz_user'), fetch_redirect_response=False)
+        self.assertEqual(review_page.from_url.call_count, 1)
+        self.assertEqual(scorer.call_count, 1)
+        self.assertEqual(BlitzReview.objects.get().review, review)
+        # The claim is given up once the submission is done
+        self.assertFalse(PendingSubmission.objects.exists())
+
+
+class LedgerTests(BlitzTestCase):
+    def approve(self, blitzreview):
+        blitzreview.refresh_from_db()
+        blitzreview.approved = True
+        blitzreview.save()
+
+    def ledger(self, **kwargs):
+        return [(entry.blitz_review_id, entry.kind, entry.points, entry.note) for entry in self.user.ledger.filter(**kwargs).order_by('id')]
+
+    def assertTotalsAdd(self):
+        # Each entry's running totals follow from the previous entry's,
+        # and the last of them is the participant's leaderboard points.
+        points_total = spent_total = 0
+        for entry in self.user.ledger.order_by('id'):
+            if entry.kind == 'spent':
+                spent_total += entry.points
+            else:
+                points_total += entry.points
+            self.assertEqual((entry.points_total, entry.spent_total), (points_total, spent_total))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, points_total)
+        self.assertEqual(self.user.points_spent, spent_total)
+
+    def test_pending_reviews_not_entered(self):
+        self.submit(100, 4, 2000)
+        self.assertEqual(self.ledger(), [])
+
+    def test_approve(self):
+        first = self.submit(100, 4, 2000, [self.long_chapter])
+        second = self.submit(101, 3, 1500)
+        self.approve(first)
+        self.approve(second)
+        self.assertEqual(self.ledger(), [
+            (first.pk, 'base', 4, ""),
+            (first.pk, 'long_chapter', Decimal('0.5'), ""),
+            (second.pk, 'base', 3, ""),
+            (second.pk, 'consecutive_chapter', 1, ""),
+        ])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, Decimal('8.5'))
+
+    def test_unchanged_ledger_not_entered_again(self):
+        self.approve(self.submit(100, 4, 2000))
+        # This review scores nothing: its entries add up to zero
+        self.approve(self.submit(101, 1, 300))
+        entries = self.ledger()
+        self.blitz.update_leaderboard()
+        self.assertEqual(self.ledger(), entries)
+        self.assertEqual(len(self.ledger(kind='base')), 2)
+        self.assertTotalsAdd()
+
+    def test_rescore(self):
+        blitzreview = self.submit(100, 4, 2000)
+        self.approve(blitzreview)
+        BlitzReview.objects.filter(pk=blitzreview.pk).update(score=6)
+        self.blitz.update_leaderboard()
+        self.assertEqual(self.ledger(kind='adjustment'), [(blitzreview.pk, 'adjustment', 2, "Score changed")])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, 6)
+
+    def test_unapprove_and_reapprove(self):
+        blitzreview = self.submit(100, 4, 2000)
+        self.approve(blitzreview)
+        # Resubmitting an approved review sends it back to the queue
+        blitzreview.approved = False
+        blitzreview.save()
+        self.assertEqual(self.ledger(kind='adjustment'), [(blitzreview.pk, 'adjustment', -4, "No longer approved")])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, 0)
+
+        # Approving it again isn't broken down a second time
+        self.approve(blitzreview)
+        self.assertEqual(self.ledger(kind='base'), [(blitzreview.pk, 'base', 4, "")])
+        self.assertEqual(self.ledger(kind='adjustment')[1:], [(blitzreview.pk, 'adjustment', 4, "Score changed")])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, 4)
+
+    def test_delete(self):
+        blitzreview = self.submit(100, 4, 2000)
+        self.approve(blitzreview)
+        blitzreview_id = blitzreview.pk
+        blitzreview.delete()
+        # The entries outlive the review
+        self.assertEqual(self.ledger(), [
+            (blitzreview_id, 'base', 4, ""),
+            (blitzreview_id, 'adjustment', -4, "No longer approved"),
+        ])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, 0)
+
+    def test_bonus_and_spent(self):
+        self.approve(self.submit(100, 4, 2000))
+        self.user.refresh_from_db()
+        self.user.bonus_points = 2
+        self.user.points_spent = Decimal('1.5')
+        self.user.save()
+        self.user.points_spent = 3
+        self.user.save()
+        self.assertEqual(self.ledger(blitz_review=None), [
+            (None, 'bonus', 2, ""),
+            (None, 'spent', Decimal('1.5'), ""),
+            (None, 'spent', Decimal('1.5'), ""),
+        ])
+        self.assertTotalsAdd()
+        self.assertEqual(self.user.points, 6)
+        self.assertEqual(PointsEntry.objects.filter(user=self.user).latest('id').spent_total, 3)
+
+
+@override_settings(VALID_FIC_FORUMS=('/forums/fics/',))
+class HasReviewedTests(BlitzTestCase):
+    # The author's threads, as listed in the forum's search results.
+    SEARCH_PAGE = """
+        <div class="contentRow-main"><a href="/threads/fic.1/">Fic</a><div class="contentRow-minor"><ul><li><a href="/forums/fics/">Fics</a></li></ul></div></div>
+        <div class="contentRow-main"><a href="/threads/other-fic.2/">Other Fic</a><div class="contentRow-minor"><ul><li><a href="/forums/fics/">Fics</a></li></ul></div></div>
+    """
+    WHO_REPLIED_PAGE = """
+        <div class="userList"><div class="contentRow"><h3><a href="/members/reviewer.2/">Reviewer</a></h3>
+        <div class="whoreplied--postcount"><a href="/search/?t=post&amp;c[thread]=2">3</a></div></div></div>
+    """
+
+    def check(self, **params):
+        request = RequestFactory().get('/blitz/has_reviewed/', params)
+        request.user = AnonymousUser()
+        view = HasReviewedView()
+        view.setup(request)
+        form = SimpleNamespace(cleaned_data={'reviewer': SimpleNamespace(object=self.reviewer), 'reviewee': SimpleNamespace(object=self.author)})
+        return view.form_valid(form).context_data
+
+    @mock.patch('reviewblitz.views.get_soups')
+    @mock.patch('reviewblitz.views.get_soup')
+    def test_unknown_threads_checked(self, get_soup, get_soups):
+        get_soup.return_value = BeautifulSoup(self.SEARCH_PAGE, 'html.parser')
+        get_soups.side_effect = lambda urls, max_workers: [BeautifulSoup(self.WHO_REPLIED_PAGE, 'html.parser') for url in urls]
+        Review.objects.create(post_id=100, author=self.reviewer, fic=self.fic, chapters=1, word_count=1000, posted_date=self.blitz.start_date)
+
+        context = self.check(refresh=1)
+        # The fic we know was reviewed comes from the database, and only
+        # the other thread is checked on the forum.
+        self.assertEqual(list(context['known_fics']), [self.fic])
+        self.assertEqual([url.split('who-replied')[0] for url in get_soups.call_args.args[0]], ["https://f/threads/other-fic.2/"])
+        self.assertEqual([(result['title'], result['count']) for result in context['results']], [("Other Fic", "3")])
@@ -1,122 +1,121 @@
+import re
 import urllib
 
 from django.conf import settings
-from django.db.models import Sum
-from django.http import HttpResponseRedirect
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.views.generic import ListView, FormView, TemplateView, DetailView
+from django.views.generic import ListView, FormView, TemplateView, DetailView, View
 from django.contrib import messages
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
-from forum.models import MemberPage, get_soup
+from forum.models import Fic, MemberPage, ReviewedAuthor, ThreadPage, get_soup, get_soups, pretty_join
 from forum.views import LoginRequiredMixin, VerificationRequiredMixin, ForumObjectLookupView
 from forum.utils import forum_url_from_path
-from reviewblitz.models import BlitzReview, ReviewBlitz, ReviewChapterLink, BlitzUser
-from reviewblitz.forms import BlitzReviewSubmissionForm, ChapterLinkFormSet, HasReviewedForm
+from reviewblitz.models import BlitzReview, ReviewBlitz, ReviewChapterLink, BlitzUser, PendingSubmission
+from reviewblitz.forms import BlitzReviewSubmissionForm, ChapterLinkFormSet, HasReviewedForm, ScoringSimulationForm
+from reviewblitz.scoring import score_review
+from reviewblitz.simulation import BlitzSimulation
+
+# How long a check of whether a reviewer has posted in an author's
+# threads is remembered for, and how many forum pages it fetches at once.
+HAS_REVIEWED_CACHE_KEY = 'has_reviewed:{}:{}'
+HAS_REVIEWED_CACHE_TIMEOUT = 60 * 60
+HAS_REVIEWED_MAX_CONNECTIONS = 6
+# How often an open leaderboard page checks for changes, in seconds.
+LEADERBOARD_POLL_INTERVAL = 15
 
 
 class BlitzReviewSubmissionFormView(LoginRequiredMixin, VerificationRequiredMixin, FormView):
     form_class = BlitzReviewSubmissionForm
     template_name = "blitz_review_submit.html"
 
+    def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        post_id = form.get_review_post_id()
+        if post_id is None:
+            # The review field will complain about this
+            return super().post(request, *args, **kwargs)
+
+        # Claim the review before fetching it, so that if it's submitted
+        # again while we're at it (a double-click, another tab), that
+        # submission gets this one's result instead of being fetched and
+        # scored a second time.
+        claim = PendingSubmission.claim(form.blitz, post_id)
+        if claim is None:
+            messages.info(request, "This review is already being submitted.")
+            return HttpResponseRedirect(reverse("blitz_user"))
+        try:
+            if form.is_valid():
+                return self.form_valid(form)
+            return self.form_invalid(form)
+        finally:
+            claim.delete()
+
+    @transaction.atomic
     def form_valid(self, form):
         review = form.cleaned_data["review"]
         review.chapters = form.cleaned_data["chapters"]
         review.save()
 
-        blitz = ReviewBlitz.get_current()
+        blitz = ReviewBlitz.get_current(self.request)
+
+        # If the user hasn't already gotten their own "blitz user" instance,
+        # create one now. Then lock it until we're done, so that the same
+        # user's submissions are scored one at a time: each has to see the
+        # others' reviews to work out its consecutive chapter and heat bonuses.
+        BlitzUser.objects.get_or_create(blitz=blitz, member=review.author)
+        BlitzUser.objects.select_for_update().get(blitz=blitz, member=review.author)
 
         # Has this review already been submitted for this Blitz?
         try:
-            blitzreview = BlitzReview.objects.get(blitz=blitz, review=review)
+            blitzreview = blitz.blitz_reviews.get(review=review)
         except BlitzReview.DoesNotExist:
             blitzreview = BlitzReview(blitz=blitz, review=review)
 
-        week_index = blitzreview.week_index()
-        print(f"This review was posted in week {week_index} of the Blitz.")
-
-        weekly_theme = blitzreview.get_theme()
-        prev_reviews = BlitzReview.objects.filter(blitz=blitz, review__author=review.author, review__fic=review.fic)
+        prev_reviews = blitz.blitz_reviews.filter(review__author=review.author_id, review__fic=review.fic_id).select_related('review')
         if blitzreview.id:
             prev_reviews = prev_reviews.filter(id__lt=blitzreview.id)
 
-        # Find how many effective chapters (i.e. number of chapters or increments of the Blitz's
-        # words per chapter, whichever is smaller) we've already reviewed of this fic this Blitz.
-        prev_chapters_reviewed = 0
-        for r in prev_reviews:
-            effective_chapters_reviewed = r.effective_chapters_reviewed()
-            prev_chapters_reviewed += r.effective_chapters_reviewed()
-            print(f"Previous review - effective chapters reviewed: {effective_chapters_reviewed}, week index: {r.week_index()}, weekly theme claimed: {r.theme}")
-
-        effective_chapters_reviewed = blitzreview.effective_chapters_reviewed()
-        print(f"Effective chapters reviewed for this review: {effective_chapters_reviewed}")
-
-        # The base score is the number of effective chapters reviewed times the base chapter points.
-        score = effective_chapters_reviewed * blitz.scoring.chapter_points
-        print(f"Base score: {score}")
-
-        # Check how many consecutive chapter intervals we tick over with this review and apply the consecutive chapter bonus.
-        if not weekly_theme or weekly_theme.consecutive_chapter_bonus_applies:
-            chapter_bonuses = (effective_chapters_reviewed + prev_chapters_reviewed) // blitz.scoring.consecutive_chapter_interval - prev_chapters_reviewed // blitz.scoring.consecutive_chapter_interval
-            print(f"Chapter bonuses: {chapter_bonuses}")
-            score += chapter_bonuses * blitz.scoring.consecutive_chapter_bonus
-
-        # Apply theme bonuses.
-        theme_bonuses_applied = 0
-
-        if weekly_theme:
-            theme_bonuses_applied = weekly_theme.claimable_theme_bonuses(form.cleaned_data["satisfies_theme"], blitzreview, prev_reviews)
-            if theme_bonuses_applied:
-                print(f"Claiming weekly theme {theme_bonuses_applied}x - +{blitz.scoring.theme_bonus * theme_bonuses_applied} points!")
-                score += blitz.scoring.theme_bonus * theme_bonuses_applied
-
-        # Apply long chapter bonuses.
-        long_chapters = set()
-        for chapter in form.cleaned_data["chapter_links"]:
-            if chapter.word_count >= blitz.scoring.long_chapter_bonus_words:
-                score += blitz.scoring.long_chapter_bonus
-                long_chapters.add(chapter)
-
-        # Apply the heat bonus.
+        # Calculate the heat bonus.
         # If we already have a blitzreview, then don't recalculate it - just keep the heat bonus the review had when originally submitted.
-        if blitz.scoring.heat_bonus_multiplier:
-            if not blitzreview.id:
-                heat_bonus = blitzreview.calculate_heat_bonus()
-                # Keep track of the heat bonus we got for this review if any, since we won't be able to recalculate it later,
-                # and we need to track whether we already received a heat bonus for this author!
-                blitzreview.heat_bonus = heat_bonus
-
-            score += blitzreview.heat_bonus
-
-        blitzreview.theme = form.cleaned_data["satisfies_theme"] and theme_bonuses_applied > 0
-        blitzreview.score = score
+        if blitz.scoring.heat_bonus_multiplier and not blitzreview.id:
+            # Keep track of the heat bonus we got for this review if any, since we won't be able to recalculate it later,
+            # and we need to track whether we already received a heat bonus for this author!
+            blitzreview.heat_bonus = blitzreview.calculate_heat_bonus()
+
+        result = score_review(blitzreview, list(prev_reviews), form.cleaned_data["satisfies_theme"], form.cleaned_data["chapter_links"])
+        blitzreview.theme = form.cleaned_data["satisfies_theme"] and result.theme_bonuses > 0
+        blitzreview.score = result.score
         blitzreview.approved = False
         blitzreview.save()
 
         if blitzreview.chapter_links.count():
             blitzreview.chapter_links.all().delete()
 
-        for chapter in long_chapters:
+        for chapter in result.long_chapters:
             ReviewChapterLink.objects.create(
                 review=blitzreview,
                 chapter=chapter
             )
 
-        # If the user hasn't already gotten their own "blitz user" instance,
-        # create one now
-        BlitzUser.objects.get_or_create(blitz=blitz, member=review.author)
-
         messages.success(self.request, "Your review has been submitted and is pending approval.")
         return HttpResponseRedirect(reverse("blitz_user"))
 
     def get_form_kwargs(self):
         kwargs = super(BlitzReviewSubmissionFormView, self).get_form_kwargs()
         kwargs["user"] = self.request.user
+        kwargs["blitz"] = ReviewBlitz.get_current(self.request)
         return kwargs
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(blitz=ReviewBlitz.get_current(), **kwargs)
+        return super().get_context_data(blitz=ReviewBlitz.get_current(self.request), **kwargs)
 
 
 class BlitzReviewApprovalQueueView(PermissionRequiredMixin, ListView):
@@ -124,94 +123,169 @@ class BlitzReviewApprovalQueueView(PermissionRequiredMixin, ListView):
     permission_required = "reviewblitz.approve"
 
     def get_queryset(self):
-        return BlitzReview.objects.filter(approved=False, blitz=ReviewBlitz.get_current())
+        return ReviewBlitz.get_current(self.request).blitz_reviews.filter(approved=False).select_related(
+            'review__author', 'review__fic'
+        ).prefetch_related('review__fic__authors', 'chapter_links__chapter__fic').order_by('id')
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        blitz_review_obj = BlitzReview.objects.get(id=request.POST.get("blitz_review_id"))
-        if request.POST.get("valid"):
-            blitz_review_obj.approved = True
-            set_theme_bonus = request.POST.get("theme")
-            if set_theme_bonus != blitz_review_obj.theme:
-                # Check how many points checking the theme bonus box is worth for this review.
-                weekly_theme = blitz_review_obj.get_theme()
-                if weekly_theme:
-                    theme_bonus_diff = (
-                        weekly_theme.claimable_theme_bonuses(True, blitz_review_obj, [])
-                        - weekly_theme.claimable_theme_bonuses(False, blitz_review_obj, [])
-                    ) * blitz_review_obj.blitz.scoring.theme_bonus
-
-                    if set_theme_bonus and not blitz_review_obj.theme:
-                        # Add theme bonus
-                        blitz_review_obj.score += theme_bonus_diff
-                        blitz_review_obj.theme = True
-                    elif blitz_review_obj.theme and not set_theme_bonus:
-                        # Remove theme bonus
-                        blitz_review_obj.score -= theme_bonus_diff
-                        blitz_review_obj.theme = False
-            blitz_review_obj.save()
-            messages.success(request, f"{blitz_review_obj.review} was approved.")
+        # Each review has its own approve/reject buttons; the buttons at the
+        # bottom of the queue act on every selected review at once.
+        if "approve" in request.POST or "reject" in request.POST:
+            approve = "approve" in request.POST
+            ids = [request.POST["approve" if approve else "reject"]]
         else:
-            blitz_review_obj.delete()
-            messages.warning(
-                request,
-                f"{blitz_review_obj.review} was rejected. Please remember to inform {blitz_review_obj.review.author}."
-            )
+            approve = request.POST.get("action") == "approve"
+            ids = request.POST.getlist("blitz_review_id")
+        blitz_reviews = list(self.get_queryset().select_for_update(of=('self',)).filter(id__in=[pk for pk in ids if pk.isdigit()]))
+        if not blitz_reviews:
+            messages.warning(request, "No reviews were selected.")
+            return HttpResponseRedirect(reverse("blitz_review_approval_queue"))
+
+        if approve:
+            theme_ids = set(request.POST.getlist("theme"))
+            for blitz_review_obj in blitz_reviews:
+                blitz_review_obj.approved = True
+                set_theme_bonus = str(blitz_review_obj.id) in theme_ids
+                if set_theme_bonus != blitz_review_obj.theme:
+                    # Check how many points checking the theme bonus box is worth for this review.
+                    weekly_theme = blitz_review_obj.get_theme()
+                    if weekly_theme:
+                        theme_bonus_diff = (
+                            weekly_theme.claimable_theme_bonuses(True, blitz_review_obj, [])
+                            - weekly_theme.claimable_theme_bonuses(False, blitz_review_obj, [])
+                        ) * blitz_review_obj.blitz.scoring.theme_bonus
+
+                        if set_theme_bonus and not blitz_review_obj.theme:
+                            # Add theme bonus
+                            blitz_review_obj.score += theme_bonus_diff
+                            blitz_review_obj.theme = True
+                        elif blitz_review_obj.theme and not set_theme_bonus:
+                            # Remove theme bonus
+                            blitz_review_obj.score -= theme_bonus_diff
+                            blitz_review_obj.theme = False
+            # Save the whole batch, then update the leaderboard once for
+            # everyone it affects, in the same transaction.
+            BlitzReview.objects.bulk_update(blitz_reviews, ['approved', 'score', 'theme'])
+            members = set()
+            for blitz_review_obj in blitz_reviews:
+                members.add(blitz_review_obj.review.author_id)
+                members.update(author.pk for author in blitz_review_obj.review.fic.get_authors())
+            blitz_reviews[0].blitz.update_leaderboard(members)
+            if len(blitz_reviews) == 1:
+                messages.success(request, f"{blitz_reviews[0].review} was approved.")
+            else:
+                messages.success(request, f"{len(blitz_reviews)} reviews were approved.")
+        else:
+            # Pending reviews don't count towards the leaderboard, so this
+            # doesn't need to update it.
+            BlitzReview.objects.filter(id__in=[blitz_review_obj.id for blitz_review_obj in blitz_reviews]).delete()
+            if len(blitz_reviews) == 1:
+                messages.warning(
+                    request,
+                    f"{blitz_reviews[0].review} was rejected. Please remember to inform {blitz_reviews[0].review.author}."
+                )
+            else:
+                reviewers = pretty_join(sorted({blitz_review_obj.review.author.username for blitz_review_obj in blitz_reviews}))
+                messages.warning(request, f"{len(blitz_reviews)} reviews were rejected. Please remember to inform {reviewers}.")
         return HttpResponseRedirect(reverse("blitz_review_approval_queue"))
 
 
+def leaderboard_etag(blitz, version):
+    return '"leaderboard-{}-{}"'.format(blitz.pk, version)
+
+
 class BlitzLeaderboardView(ListView):
     template_name = "blitz_leaderboard.html"
     context_object_name = "leaderboard"
 
     def get_object(self):
-        return ReviewBlitz.get_current()
+        return ReviewBlitz.get_current(self.request)
 
     def get_queryset(self):
-        return ReviewBlitz.get_current().get_leaderboard()
+        return ReviewBlitz.get_current(self.request).get_leaderboard()
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(blitz=ReviewBlitz.get_current(), **kwargs)
+        blitz = ReviewBlitz.get_current(self.request)
+        return super().get_context_data(blitz=blitz, weeks=blitz.weeks(), leaderboard_etag=leaderboard_etag(blitz, blitz.get_leaderboard_version()[0]), leaderboard_poll_interval=LEADERBOARD_POLL_INTERVAL, **kwargs)
+
+
+class BlitzLeaderboardJSONView(View):
+    """
+    The current leaderboard as JSON, for keeping an open leaderboard
+    page up to date. The ETag and Last-Modified headers come from the
+    leaderboard version, so a client that sends them back gets a 304
+    until the leaderboard changes. This answers straight away rather
+    than holding the request open, so polling clients never tie up a
+    worker.
+
+    """
+    def get(self, request, *args, **kwargs):
+        blitz = ReviewBlitz.get_current(self.request)
+        version, updated = blitz.get_leaderboard_version()
+        etag = leaderboard_etag(blitz, version)
+        last_modified = int(updated.timestamp()) if updated else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = JsonResponse({
+                'version': version,
+                'leaderboard': [{
+                    'member': entry.member_id,
+                    'username': entry.username,
+                    'rank': entry.rank,
+                    'tied': entry.tied,
+                    'points': entry.points,
+                    'weekly_points': entry.weekly_points,
+                    'reviews': entry.reviews,
+                    'chapters': entry.chapters,
+                    'heat_bonus': entry.heat_bonus,
+                    'words': entry.words,
+                } for entry in blitz.get_leaderboard()]
+            })
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
 
 
 class BlitzUserView(LoginRequiredMixin, TemplateView):
     template_name = "blitz_user.html"
 
     def get_context_data(self, *args, **kwargs):
-        context = super(BlitzUserView, self).get_context_data(*args, **kwargs) 
+        context = super(BlitzUserView, self).get_context_data(*args, **kwargs)
+        blitz = ReviewBlitz.get_current(self.request)
+        member = self.request.user.member
 
-        # Get user info
-        # Any bonuses from prize fulfillment (or other sources)
-        # Any points spent for prizes
-
-        user, _ = BlitzUser.objects.get_or_create(blitz=ReviewBlitz.get_current(), member=self.request.user.member)
-
-        try:
-            queryset = BlitzReview.objects.filter(blitz=ReviewBlitz.get_current(), review__author=self.request.user.member.user_id).order_by('-review__posted_date')
-        except AttributeError:
+        if member is None or member.user_id is None:
             # User not verified
-            # Query fails because they don't have a user_id
-            queryset = BlitzReview.objects.none()
+            reviews = BlitzReview.objects.none()
+        else:
+            reviews = blitz.blitz_reviews.filter(review__author=member.user_id)
 
-        approved_reviews = queryset.filter(approved=True)
-        context['approved_reviews'] = approved_reviews
+        # Any bonuses from prize fulfillment (or other sources) and any
+        # points spent for prizes; nothing if the user hasn't taken part
+        bonus_points, points_spent = blitz.blitzes.filter(member=member).values_list('bonus_points', 'points_spent').first() or (0, 0)
 
-        approved_score = approved_reviews.aggregate(approved_score=Sum('score')).get('approved_score')
-        if approved_score is not None:
-            context['approved_score'] = approved_score
-        else:
-            context['approved_score'] = 0
+        stats = reviews.aggregate(
+            approved_score=Sum('score', filter=Q(approved=True), default=0),
+            approved_count=Count('id', filter=Q(approved=True)),
+            pending_score=Sum('score', filter=Q(approved=False)),
+            pending_count=Count('id', filter=Q(approved=False)),
+        )
+        context.update(stats)
 
         # Apply any potential bonus points to get effective score
-        print(context['approved_score'])
-        print(user.bonus_points)
-        context['approved_score'] = context['approved_score'] + user.bonus_points
+        context['approved_score'] = stats['approved_score'] + bonus_points
 
         # Show prize points available by deducting points spent from total score
-        context['prize_points'] = context['approved_score'] - user.points_spent
-
-        pending_reviews = queryset.filter(approved=False)
-        context['pending_reviews'] = pending_reviews
-        context['pending_score'] = pending_reviews.aggregate(approved_score=Sum('score')).get('approved_score')
+        context['prize_points'] = context['approved_score'] - points_spent
+
+        context['approved_reviews'] = []
+        context['pending_reviews'] = []
+        for blitzreview in reviews.select_related('review__fic').order_by('-review__posted_date'):
+            # Use the current Blitz's prefetched weekly themes
+            blitzreview.blitz = blitz
+            context['approved_reviews' if blitzreview.approved else 'pending_reviews'].append(blitzreview)
         return context
 
 
@@ -220,32 +294,30 @@ class BlitzHistoryView(ListView):
     context_object_name = "blitzes"
 
     def get_queryset(self):
-        return ReviewBlitz.objects.exclude(pk=ReviewBlitz.get_current().pk)
+        return ReviewBlitz.objects.exclude(pk=ReviewBlitz.get_current(self.request).pk)
 
 
 class BlitzView(DetailView):
-    model = ReviewBlitz
+    queryset = ReviewBlitz.objects.prefetch_related('weekly_themes__theme')
     template_name = "blitz.html"
     context_object_name = "blitz"
 
     def get_context_data(self, **kwargs):
-        blitz = self.get_object()
-
-        if self.request.user.is_authenticated and self.request.user.member:
-            user, _ = BlitzUser.objects.get_or_create(blitz=blitz, member=self.request.user.member)
-
-            try:
-                queryset = BlitzReview.objects.filter(blitz=blitz, review__author=self.request.user.member.user_id, approved=True).order_by('-review__posted_date')
-            except AttributeError:
-                # User not verified
-                # Query fails because they don't have a user_id
-                queryset = BlitzReview.objects.none()
+        blitz = self.object
+        member = self.request.user.member if self.request.user.is_authenticated else None
+
+        if member is not None and member.user_id is not None:
+            user_reviews = list(blitz.blitz_reviews.filter(review__author=member.user_id, approved=True).select_related('review__fic').order_by('-review__posted_date'))
+            for blitzreview in user_reviews:
+                # Use the prefetched weekly themes
+                blitzreview.blitz = blitz
         else:
-            queryset = BlitzReview.objects.none()
+            # User not verified
+            user_reviews = []
 
         return super().get_context_data(
-            user_reviews=queryset,
-            leaderboard=self.get_object().get_leaderboard(),
+            user_reviews=user_reviews,
+            leaderboard=blitz.get_final_standings(),
             **kwargs
         )
 
@@ -282,31 +354,66 @@ class HasReviewedView(FormView):
         reviewer = form.cleaned_data['reviewer'].object
         reviewee = form.cleaned_data['reviewee'].object
 
+        # Reviews stored here answer the question for the fics they're of,
+        # and show whether the author has reviewed the reviewer back.
+        edges = {(edge.reviewer_id, edge.author_id): edge for edge in ReviewedAuthor.objects.filter(
+            Q(reviewer=reviewer.pk, author=reviewee.pk) | Q(reviewer=reviewee.pk, author=reviewer.pk)
+        )}
+        context = {
+            'reviewed': edges.get((reviewer.pk, reviewee.pk)),
+            'reviewed_back': edges.get((reviewee.pk, reviewer.pk)),
+        }
+
+        known_threads = []
+        if context['reviewed']:
+            context['known_fics'] = Fic.objects.filter(authors=reviewee.pk, reviews__author=reviewer.pk).annotate(review_count=Count('reviews')).order_by('title')
+            known_threads = sorted({fic.thread_id for fic in context['known_fics']})
+
+        # The reviewer may also have posted in threads we don't know of any
+        # reviews in, so check the forum for those.
+        cache_key = HAS_REVIEWED_CACHE_KEY.format(reviewer.user_id, reviewee.user_id)
+        checked = None if self.request.GET.get('refresh') else cache.get(cache_key)
+        if checked is None or checked['known_threads'] != known_threads:
+            checked = {'results': self.find_threads_posted_in(reviewer, reviewee, known_threads), 'date': timezone.now(), 'known_threads': known_threads}
+            cache.set(cache_key, checked, HAS_REVIEWED_CACHE_TIMEOUT)
+        context.update(results=checked['results'], checked_date=checked['date'])
+
+        return self.render_to_response(self.get_context_data(form=form, reviewer=reviewer, reviewee=reviewee, **context))
+
+    def find_threads_posted_in(self, reviewer, reviewee, known_threads=()):
+        """
+        Returns the reviewee's fanfiction threads that the reviewer has
+        posted in, leaving out those with the given thread IDs, which we
+        already know the reviewer has reviewed.
+
+        """
         # First, scrape the search results for the author's threads.
         soup = get_soup("https://{}search/member?user_id={}&content=thread".format(settings.FORUM_URL, reviewee.user_id))
+        soups = [soup]
 
-        results = []
+        # The rest of the result pages are fetched all at once, by
+        # swapping the page number into the link to the second page.
+        pagination = soup.find('nav', class_="pageNavWrapper")
+        next_link = pagination.find('a', class_="pageNav-jump--next") if pagination else None
+        if next_link:
+            last_page = max((int(link.get_text()) for link in pagination.select('.pageNav-page a') if link.get_text().strip().isdigit()), default=2)
+            soups += get_soups([
+                forum_url_from_path(re.sub(r'(page[=-])\d+', r'\g<1>{}'.format(page), next_link['href'])) for page in range(2, last_page + 1)
+            ], HAS_REVIEWED_MAX_CONNECTIONS)
 
         threads = []
-
-        def process_results(result_threads):
-            for result in result_threads:
+        for soup in soups:
+            for result in soup.find_all('div', class_="contentRow-main"):
                 if result.find('div', class_="contentRow-minor").ul.find_all('li')[-1].a['href'] in settings.VALID_FIC_FORUMS:
-                    threads.append({'link': forum_url_from_path(result.a['href']), 'title': result.a.contents[-1]})
-
-        process_results(soup.find_all('div', class_="contentRow-main"))
-
-        pagination = soup.find('nav', class_="pageNavWrapper")
-        if pagination:
-            while nextLink := pagination.find('a', class_="pageNav-jump--next"):
-                soup = get_soup(forum_url_from_path(nextLink['href']))
-
-                pagination = soup.find('nav', class_="pageNavWrapper")
-                process_results(soup.find_all('div', class_="contentRow-main"))
-
-        for thread in threads:
-            soup = get_soup("{}who-replied/?xfFilter[text]={}".format(thread['link'], urllib.parse.quote_plus(reviewer.username)))
+                    link = forum_url_from_path(result.a['href'])
+                    if int(ThreadPage.get_params_from_url(link)['thread_id']) not in known_threads:
+                        threads.append({'link': link, 'title': str(result.a.contents[-1])})
 
+        results = []
+        soups = get_soups([
+            "{}who-replied/?xfFilter[text]={}".format(thread['link'], urllib.parse.quote_plus(reviewer.username)) for thread in threads
+        ], HAS_REVIEWED_MAX_CONNECTIONS)
+        for thread, soup in zip(threads, soups):
             user_list = soup.find('div', class_="userList")
             if user_list:
                 # Verify that this really is the correct user.
@@ -317,6 +424,30 @@ class HasReviewedView(FormView):
                         thread['count'] = postcount.text.strip()
                         results.append(thread)
                         break
+        return results
+
+
+class ScoringSimulationView(TemplateView):
+    """
+    An admin view showing how a past Blitz's leaderboard would have
+    turned out under different scoring systems.
 
-        return self.render_to_response(self.get_context_data(form=form, reviewer=reviewer, reviewee=reviewee, results=results))
+    """
+    template_name = "admin/reviewblitz/simulate_scoring.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = ScoringSimulationForm(self.request.GET or None)
+        if form.is_valid():
+            varied = form.cleaned_data["varied"]
+            context['simulation'] = BlitzSimulation(form.cleaned_data["blitz"])
+            context['varied'] = [form.fields[field_name].label for field_name in varied]
+            context['results'] = [
+                dict(result, values=[result['config'][field_name] for field_name in varied])
+                for result in context['simulation'].simulate(form.cleaned_data["grid"])
+            ]
+        context['form'] = form
+        context['opts'] = ReviewBlitz._meta
+        context['title'] = "Simulate scoring"
+        context['app_label'] = 'reviewblitz'
+        return context